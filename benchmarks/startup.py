@@ -0,0 +1,69 @@
+"""
+Startup time and peak memory of the ways to run the LOO, each in a fresh interpreter.
+
+    python benchmarks/startup.py [--n-max 25] [--repeat 3]
+
+Run from the folder with the workbooks. The thesis script is run as is (plots = True, with
+the non-interactive Agg backend so that no window opens) and as a compute-only run with
+plots = False, set the way a notebook parameter would be: by substituting the line.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "thesis_seb_liu.py")
+
+# Each case is run with `python -c` and prints its peak RSS (kB) as the last line
+
+PEAK = "import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def script_case(plots, n_max):
+    source = ("src = open("+repr(SCRIPT)+").read()"
+              ".replace('plots = True', 'plots = "+str(plots)+"', 1)"
+              ".replace('n_max = 25', 'n_max = "+str(n_max)+"', 1)\n"
+              "exec(compile(src, "+repr(SCRIPT)+", 'exec'), {'__name__': '__main__'})\n")
+    return source+PEAK
+
+
+def cases(n_max):
+    return [
+        ("import termstructure", "import termstructure\n"+PEAK),
+        ("import termstructure stages", "import termstructure.loo, termstructure.surface\n"+PEAK),
+        ("python -m termstructure --help",
+         "import sys, runpy, contextlib, io\nsys.argv = ['termstructure', '--help']\n"
+         "with contextlib.redirect_stdout(io.StringIO()):\n"
+         "    try: runpy.run_module('termstructure', run_name='__main__')\n"
+         "    except SystemExit: pass\n"+PEAK),
+        ("script, plots = True", script_case(True, n_max)),
+        ("script, plots = False", script_case(False, n_max)),
+    ]
+
+
+def run(code):
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                         check=True)
+    return time.perf_counter() - start, int(out.stdout.split()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-max", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    print(f"{'':<34}{'time (s)':>10}{'peak RSS (MB)':>16}")
+    for name, code in cases(args.n_max):
+        results = [run(code) for _ in range(args.repeat)]
+        print(f"{name:<34}{min(t for t, _ in results):>10.2f}"
+              f"{max(m for _, m in results)/1024:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
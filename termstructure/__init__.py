@@ -0,0 +1,17 @@
+"""
+Library code for "Retrospective Evaluation of Methods for Term Structure Measurement".
+
+The notebook script thesis_seb_liu.py calls into these modules for the heavy stages. Batch
+jobs can use the headless functions of termstructure.api, re-exported here; importing the
+package does not import pandas, QuantLib or matplotlib.
+"""
+
+__all__ = ["Market", "load_quotes", "bootstrap_history", "loo_errors", "interpolate_surface"]
+
+
+def __getattr__(name):
+    # The api names, resolved on first access
+    if name in __all__:
+        from termstructure import api
+        return getattr(api, name)
+    raise AttributeError("module 'termstructure' has no attribute "+repr(name))
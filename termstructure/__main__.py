@@ -0,0 +1,84 @@
+"""
+Command line entry point of the headless stages (see termstructure.api):
+
+    python -m termstructure SEK --first-date 2021-01-01 --methods linear natural_cubic
+
+loads the quotes, bootstraps the dates (reusing the curve cache), LOO-evaluates them and
+writes the tidy dX_IRS table to a CSV file, optionally with the daily forward surfaces.
+"""
+
+import argparse
+import os
+
+from termstructure import api
+
+STORE_DIR = ".curve_cache" # pillars.STORE_DIR, not imported so that --help stays instant
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m termstructure",
+        description="Bootstrap and leave-one-out evaluate the curves of a quote workbook.")
+    parser.add_argument("currency", help="SEK or EUR")
+    parser.add_argument("--ois", default=None,
+                        help="overnight index (STINA for SEK, EONIA for EUR)")
+    parser.add_argument("--ibor", default=None,
+                        help="IBOR index (STIBOR3M for SEK, EURIBOR6M for EUR)")
+    parser.add_argument("--first-date", default=None, help="first valuation date, YYYY-MM-DD")
+    parser.add_argument("--last-date", default=None, help="last valuation date, YYYY-MM-DD")
+    parser.add_argument("--n-max", type=int, default=None,
+                        help="only use the n_max newest rows of the workbook")
+    parser.add_argument("--folder", default=".", help="folder with the Excel workbooks")
+    parser.add_argument("--methods", nargs="+", default=["linear"],
+                        help="interpolation methods, see termstructure/interpolation.py")
+    parser.add_argument("--surface", nargs="*", default=[], choices=["ois", "tenor"],
+                        help="also write the daily forward surfaces of these curves, for the "
+                             "first method")
+    parser.add_argument("--cache-dir", default=STORE_DIR,
+                        help="folder of the pillar store and the outputs")
+    parser.add_argument("--no-cache", action="store_true", help="bootstrap every date again")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--native-bootstrap", action="store_true",
+                        help="bootstrap all dates together in NumPy instead of QuantLib")
+    parser.add_argument("--out", default=None, help="CSV file for the errors "
+                        "(default <cache-dir>/<currency>-dX_IRS-sweep.csv)")
+    return parser
+
+
+def main(argv=None):
+    cli = parser()
+    args = cli.parse_args(argv)
+    from termstructure import interpolation, quotes, surface
+    if args.currency not in quotes.MARKETS:
+        cli.error("currency must be one of "+", ".join(sorted(quotes.MARKETS)))
+    ois, ibor = quotes.MARKETS[args.currency]
+    for given, available, option in ((args.ois, ois, "--ois"), (args.ibor, ibor, "--ibor")):
+        if given is not None and given != available:
+            cli.error(option+" "+given+" is not available for "+args.currency
+                      + ", the workbook holds "+available)
+    unknown = [method for method in args.methods if method not in interpolation.INTERPOLATORS]
+    if unknown:
+        cli.error("unknown method "+", ".join(unknown)+", choose from "
+                  + ", ".join(interpolation.INTERPOLATORS))
+
+    market = api.load_quotes(args.currency, args.n_max, args.folder, args.first_date,
+                             args.last_date)
+    print(len(market.serials), args.currency, "valuation dates,", ois, "and", ibor)
+    if len(market.serials) == 0:
+        return
+    pillars = api.bootstrap_history(market, None if args.no_cache else args.cache_dir,
+                                    args.processes, verbose=True, native=args.native_bootstrap)
+    dX = api.loo_errors(market, pillars, args.methods, verbose=True)
+    path = args.out or os.path.join(args.cache_dir, args.currency+"-dX_IRS-sweep.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    dX.to_csv(path, index=False)
+    print(len(dX), "errors written to", path)
+
+    for curve in args.surface:
+        surface_path = surface.surface_path(market.layout, curve, args.methods[0], args.cache_dir)
+        api.interpolate_surface(market, pillars, curve, args.methods[0], surface_path)
+        print(curve, "surface written to", surface_path)
+
+
+if __name__ == "__main__":
+    main()
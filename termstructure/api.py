@@ -0,0 +1,74 @@
+"""
+Headless entry points to the stages of thesis_seb_liu.py, for batch jobs.
+
+    market = load_quotes("SEK", first_date="2021-01-01")
+    pillars = bootstrap_history(market)
+    dX = loo_errors(market, pillars, ["linear", "natural_cubic"])
+    surface = interpolate_surface(market, pillars, "tenor", "linear")
+
+Nothing is plotted and no globals are involved. The stage modules (and with them pandas and
+QuantLib) are only imported when a function is first called, so importing termstructure is
+cheap. See also `python -m termstructure --help`.
+"""
+
+import collections
+
+# The quotes of one market: bootstrap.CurveLayout, valuation dates (QuantLib serial numbers,
+# newest first) and mid rates in decimals, one list per date
+
+Market = collections.namedtuple(
+    "Market", ["layout", "serials", "OIS_ratess", "IRS_ratess", "IBOR_ratess"])
+
+
+def load_quotes(currency, n_max=None, folder=".", first_date=None, last_date=None):
+    """
+    Market of the workbook of `currency`, restricted to the n_max newest rows and to
+    valuation dates within [first_date, last_date] (anything np.datetime64 accepts).
+    """
+    import numpy as np
+
+    from termstructure import bootstrap, quotes
+
+    dfs = quotes.align_quotes(quotes.load_panel(currency, n_max, folder)).frames()
+    layout, serials, OIS_ratess, IRS_ratess, IBOR_ratess = bootstrap.market_rates(currency, dfs)
+    keep = np.ones(len(serials), dtype=bool)
+    if first_date is not None:
+        keep &= serials >= bootstrap.to_serial(np.datetime64(first_date, "D"))
+    if last_date is not None:
+        keep &= serials <= bootstrap.to_serial(np.datetime64(last_date, "D"))
+    rows = np.flatnonzero(keep)
+    return Market(layout, serials[rows], [OIS_ratess[k] for k in rows],
+                  [IRS_ratess[k] for k in rows], [IBOR_ratess[k] for k in rows])
+
+
+def bootstrap_history(market, cache_dir=None, processes=None, verbose=False, native=False):
+    """
+    PillarStore of every date of `market`. With a cache_dir (e.g. pillars.STORE_DIR), dates
+    already stored there with the same quotes are not bootstrapped again. With native, the
+    dates are bootstrapped in NumPy instead of QuantLib (see native_bootstrap).
+    """
+    from termstructure import pillars
+
+    path = pillars.store_path(market.layout, cache_dir) if cache_dir is not None else None
+    return pillars.bootstrap_store(market.layout, market.serials, market.OIS_ratess,
+                                   market.IRS_ratess, market.IBOR_ratess, path=path,
+                                   processes=processes, verbose=verbose, native=native)
+
+
+def loo_errors(market, pillars, methods=("linear",), verbose=False):
+    # dX_IRS of every date, left-out tenor and interpolation method (loo.loo_sweep layout)
+    from termstructure import loo
+
+    return loo.loo_sweep(market.layout, pillars, list(methods), verbose=verbose)
+
+
+def interpolate_surface(market, pillars, curve="tenor", method="linear", path=None):
+    """
+    Daily forward surface (surface.Surface) of the "ois" or "tenor" curve. With a path it is
+    streamed to a memory-mapped file there and returned opened read-only.
+    """
+    from termstructure import surface
+
+    if path is None:
+        return surface.daily_surface(market.layout, pillars, curve, method)
+    return surface.write_surface(path, market.layout, pillars, curve, method)
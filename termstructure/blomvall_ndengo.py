@@ -0,0 +1,552 @@
+"""
+The Blomvall-Ndengo (2013) forward curve of opt5.mod, solved without AMPL.
+
+The model has daily forward rates f = f_0 + pi on days 0..n and minimizes
+
+    sum_t a[t]((f_0[t+1]-f_0[t])/xi)^2 xi/2 + sum_i E[i] z[i]^2/2 + sum_t a[t]((pi[t+1]-pi[t])/xi)^2 xi/2
+
+subject to one exponential pricing constraint per OIS,
+
+    D_i(T0[i]) - D_i(TN[i]) = p[i] sum_j dt[i, j] D_i(Ti[i, j]),
+    D_i(T) = exp(-sum_{t=0..T} (f_0[t] + F[i] z[i])/365),
+
+and optionally one per deposit and IRS of the tenor curve f_0 + pi (TenorContracts, e.g.
+STIBOR3M), with the IRS discounted on f_0.
+
+The problem is solved by Newton's method on the KKT conditions (SQP with the exact
+Hessian), written in the integrated forwards Phi[t] = sum_{u<=t} f_0[u] and Pi[t] =
+sum_{u<=t} pi[u]. In these the smoothness penalty is a pentadiagonal quadratic form and
+every discount factor depends on one or two variables, so the Jacobian has a few nonzeros
+per cashflow, the constraint Hessians are small dense blocks per cashflow, and each step
+is one sparse KKT solve (scipy.sparse), also for two daily curves of tens of thousands of
+days. Without tenor instruments pi does not enter the constraints, so its penalty is
+minimized by any constant; the fit then returns pi = 0, where an interior point solver
+started at zero stays. Discount factors, constraints and their exact Jacobian are the
+prefix-sum lookups of discounting.py.
+
+fit_history fits a history of dates, each warm started from the previous one, and
+loo_rates/loo_errors leave every OIS out in turn with the KKT matrix of the full fit
+factorized once, instead of fitting the curve again per left-out quote.
+"""
+
+import collections
+
+import numpy as np
+import QuantLib as ql
+
+from termstructure import bootstrap, calendars, discounting, swaps
+from termstructure.discounting import DAYS
+
+XI = 1/365
+LABEL = "Blomvall-Ndengo" # method label of the LOO errors, next to e.g. "Linear on Forward"
+
+# The OIS of the constraints, as the parameters of opt5.mod: settlement and maturity day
+# (days from the valuation date), the payment days Ti and accrual fractions dt of the fixed
+# leg (padded with zero fractions to the longest contract) and the quoted rates p.
+
+OISContracts = collections.namedtuple("OISContracts", ["T0", "TN", "Ti", "dt", "p"])
+
+# The tenor (IBOR) instruments of a date, in days from the valuation date. Deposits run from
+# T0 to TN with accrual fraction dt and quoted rate L. Swaps are spot-starting IRS with fixed
+# payments on fixed_days (accrual fractions fixed_dt) and floating coupons paid on
+# float_days (accrual float_dt) that forecast over [starts, ends] (index fraction spans),
+# padded with zero accruals, and par rates p. Both are priced on the tenor curve f_0 + pi
+# and the IRS discounted on the OIS curve f_0.
+
+Deposits = collections.namedtuple("Deposits", ["T0", "TN", "dt", "L"])
+Swaps = collections.namedtuple(
+    "Swaps", ["fixed_days", "fixed_dt", "float_days", "float_dt", "starts", "ends", "spans",
+              "p"])
+TenorContracts = collections.namedtuple("TenorContracts", ["deposits", "swaps"])
+
+# Result of a fit: daily f_0, pi and f = f_0 + pi on days 0..n, the price deviations z, the
+# objective value, the Newton iterations used, the largest constraint residual and the
+# Lagrange multipliers of the constraints (to warm start the next fit).
+
+BNFit = collections.namedtuple(
+    "BNFit", ["f_0", "pi", "f", "z", "objective", "iterations", "residual", "multipliers"])
+
+# One valuation date of fit_history: the date (QuantLib serial number), its OIS contracts and
+# TenorContracts (None for the OIS curve alone), the fit and the solve time in seconds.
+
+BNDate = collections.namedtuple("BNDate", ["serial", "contracts", "tenor", "fit", "seconds"])
+
+
+def _advanced(calendar, anchors, periods, convention=ql.Following, endOfMonth=False):
+    # calendar.advance of every anchor serial by the matching ql.Period, one cached
+    # calendars.advance call per time unit
+    units = np.array([period.units() for period in periods])
+    lengths = np.array([period.length() for period in periods])
+    anchors = np.broadcast_to(anchors, units.shape)
+    dates = np.empty(len(units), dtype=np.int64)
+    for unit in np.unique(units):
+        k = np.flatnonzero(units == unit)
+        dates[k] = calendars.advance(calendar, anchors[k], lengths[k], int(unit), convention,
+                                     endOfMonth)
+    return dates
+
+
+def months(period):
+    # Length of a ql.Period in months, None for days and weeks
+    if period.units() == ql.Years:
+        return 12*period.length()
+    if period.units() == ql.Months:
+        return period.length()
+    return None
+
+
+def ois_contracts(valuation_date, tenors, rates, settlement_days=2, calendar=None,
+                  dayCounter=None):
+    """
+    OISContracts of the quotes `rates` (decimals) at `tenors` (any ql.Period string) on
+    `valuation_date`, with the schedule of the Blomvall-Ndengo script: settlement after
+    settlement_days calendar days, one fixed payment at maturity for tenors of up to twelve
+    months in days, weeks or months, and yearly payments for tenors in years or of more than
+    twelve months, rolled back from the maturity with a short first period (e.g. "18M" pays
+    after 6 and 18 months). The dates of all tenors are computed together.
+    """
+    if calendar is None:
+        calendar = ql.Sweden()
+    if dayCounter is None:
+        dayCounter = ql.Thirty360(ql.Thirty360.USA)
+    valuation = valuation_date.serialNumber()
+    spot = valuation + settlement_days
+    periods = [ql.Period(tenor) for tenor in tenors]
+
+    # One (end anchor, end period, start anchor, start period) per fixed payment, the start
+    # of a single payment is the unadjusted spot date
+    tenor_of, ends, starts = [], [], []
+    for i, period in enumerate(periods):
+        length = months(period)
+        if period.units() == ql.Years or (length or 0) > 12:
+            offsets = length - 12*np.arange(-(-length//12))[::-1]
+            ends += [ql.Period(int(k), ql.Months) for k in offsets]
+            starts += [ql.Period(int(max(k-12, 0)), ql.Months) for k in offsets]
+            tenor_of += [i]*len(offsets)
+        else:
+            ends.append(period)
+            starts.append(None)
+            tenor_of.append(i)
+    tenor_of = np.array(tenor_of)
+    end_dates = _advanced(calendar, valuation, ends)
+    start_dates = np.full(len(starts), spot, dtype=np.int64)
+    rolled = np.array([start is not None for start in starts])
+    start_dates[rolled] = _advanced(calendar, spot, [start for start in starts if start])
+    fracs = calendars.year_fractions(dayCounter, start_dates, end_dates)
+
+    counts = np.bincount(tenor_of, minlength=len(tenors))
+    column = np.arange(len(tenor_of)) - np.repeat(np.cumsum(counts) - counts, counts)
+    Ti = np.zeros((len(tenors), counts.max()), dtype=np.int64)
+    dt = np.zeros(Ti.shape)
+    Ti[tenor_of, column] = end_dates - valuation
+    dt[tenor_of, column] = fracs
+    TN = Ti[np.arange(len(tenors)), counts-1]
+    return OISContracts(np.full(len(tenors), settlement_days, dtype=np.int64), TN, Ti, dt,
+                        np.asarray(rates, dtype=np.float64))
+
+
+def tenor_contracts(layout, valuation_serial, IBOR_rates, IRS_rates):
+    """
+    TenorContracts of the IBOR and IRS quotes of bootstrap.CurveLayout `layout` (decimals)
+    on one valuation date: the deposits of the DepositRateHelpers of bootstrap.CurveBuilder
+    and the IRS repriced in the LOO (swaps.date_schedules), on the tenor curve of the
+    layout's IBOR index (e.g. STIBOR3M).
+    """
+    calendar, qlCurrency, dayConvention, fracConvention = bootstrap.conventions(layout.currency)
+    valuation = int(valuation_serial)
+    start = calendars.advance(calendar, [valuation], bootstrap.fixingDays)[0]
+    periods = [ql.Period(tenor) for tenor in layout.ibor_tenors]
+    ends = _advanced(calendar, start, periods, ql.ModifiedFollowing, True)
+    deposits = Deposits(np.full(len(periods), start - valuation, dtype=np.int64),
+                        ends - valuation,
+                        calendars.year_fractions(dayConvention, [start]*len(periods), ends),
+                        np.asarray(IBOR_rates, dtype=np.float64))
+
+    schedules = swaps.date_schedules(layout, valuation, layout.irs_tenors)
+    n_fixed = max(len(s.fixed_dates) for s in schedules)
+    n_float = max(len(s.float_dates) for s in schedules)
+
+    def padded(arrays, width, value=0):
+        out = np.full((len(arrays), width), value, dtype=np.asarray(arrays[0]).dtype)
+        for i, a in enumerate(arrays):
+            out[i, :len(a)] = a
+        return out
+
+    days = lambda dates: dates.astype(np.int64) - valuation
+    irs = Swaps(padded([days(s.fixed_dates) for s in schedules], n_fixed),
+                padded([s.fixed_accruals for s in schedules], n_fixed),
+                padded([days(s.float_dates) for s in schedules], n_float),
+                padded([s.float_accruals for s in schedules], n_float),
+                padded([days(s.fixing_starts) for s in schedules], n_float),
+                padded([days(s.fixing_ends) for s in schedules], n_float),
+                padded([s.fixing_spans for s in schedules], n_float, 1.0),
+                np.asarray(IRS_rates, dtype=np.float64))
+    return TenorContracts(deposits, irs)
+
+
+def smoothness_matrix(a, xi=XI):
+    # Q with sum_t a[t]((f[t+1]-f[t])/xi)^2 xi/2 = f'Qf/2, for f on days 0..len(a)
+    from scipy import sparse
+    n = len(a)
+    D = sparse.diags([-np.ones(n), np.ones(n)], [0, 1], shape=(n, n+1))
+    return (D.T @ sparse.diags(np.asarray(a, dtype=np.float64)/xi) @ D).tocsc()
+
+
+def ois_rates(f, contracts):
+    # Par rates of the contracts on the daily forwards f, as the constraints price them
+    return discounting.ois_rates(discounting.prefix_sums(f), contracts)
+
+
+def objective(f_0, pi, z, a, E, xi=XI):
+    return (np.sum(a*np.diff(f_0)**2)/xi + np.sum(E*z*z) + np.sum(a*np.diff(pi)**2)/xi)/2
+
+
+class _Problem:
+    """
+    The pieces of the KKT conditions of one fit, shared by fit and loo_rates. The variables
+    are x = (Phi on days 0..n, with tenor contracts also Pi = cumsum(pi) on days 0..n, z of
+    the OIS with F != 0) and the constraints the OIS followed by the deposits and the IRS.
+    """
+
+    def __init__(self, contracts, n=None, a=None, E=0.0, F=0.0, xi=XI, tenor=None):
+        from scipy import sparse
+
+        n_ois = len(contracts.p)
+        terms = [discounting.ois_terms(contracts)]
+        if tenor is not None:
+            terms += [discounting.deposit_terms(tenor.deposits),
+                      discounting.swap_terms(tenor.swaps)]
+        self.terms = terms = discounting.stacked(*terms)
+        self.n_contracts = n_rows = len(terms.weights)
+        if n is None:
+            n = int(terms.days.max())
+        if a is None:
+            a = np.ones(n)
+        self.n, self.a, self.xi = n, np.asarray(a, dtype=np.float64), xi
+        self.n_curves = 1 if tenor is None else 2
+        self.E = np.broadcast_to(np.asarray(E, dtype=np.float64), (n_ois,))
+        F = np.broadcast_to(np.asarray(F, dtype=np.float64), (n_ois,))
+        if terms.days.max() > n:
+            raise ValueError("The contracts pay after day n = "+str(n))
+
+        # Integrated forwards Phi = L f_0 (L lower triangular ones), f_0 = B Phi (B bidiagonal),
+        # and the same for Pi and pi
+        self.B = sparse.diags([np.ones(n+1), -np.ones(n)], [0, -1], format="csc")
+        self.Q = smoothness_matrix(self.a, xi)
+        BQB = (self.B.T @ self.Q @ self.B).tocsc()
+
+        # Deviation variables only for the OIS with F != 0, the others stay at zero
+        self.free = free = np.flatnonzero(F != 0)
+        n_curve = self.n_curves*(n+1)
+        self.n_x = n_curve + len(free)
+        self.z_col = np.full(n_rows, -1)
+        self.z_col[free] = n_curve + np.arange(len(free))
+        self.G = sparse.block_diag([BQB]*self.n_curves + [sparse.diags(self.E[free])],
+                                   format="csc")
+        days = discounting.cashflows(contracts)[0]
+        self.shift = np.zeros(terms.weights.shape)
+        self.shift[:n_ois, :days.shape[1]] = discounting.shifts(days, F)
+
+        # Position in x of every factor, and the nonzero Jacobian and Hessian entries: each
+        # factor of a term, and each pair of factors of the same term
+        self.index = terms.curves*(n+1) + terms.days
+        self.factors = (terms.coefs != 0) & (terms.weights != 0)[..., None]
+        self.pairs = self.factors[..., :, None] & self.factors[..., None, :]
+        rows = np.broadcast_to(np.arange(n_rows)[:, None, None], self.index.shape)
+        self.J_rows, self.J_cols = rows[self.factors], self.index[self.factors]
+        self.H_rows = np.broadcast_to(self.index[..., :, None], self.pairs.shape)[self.pairs]
+        self.H_cols = np.broadcast_to(self.index[..., None, :], self.pairs.shape)[self.pairs]
+        # The z of row i enters every factor of its terms
+        z_factors = self.factors & (self.z_col >= 0)[:, None, None]
+        self.zf_rows = self.index[z_factors]
+        self.zf_cols = np.broadcast_to(self.z_col[:, None, None], self.index.shape)[z_factors]
+        self.z_factors = z_factors
+
+    def start(self, f_0, z=None, pi=None):
+        # x of the forwards f_0 and pi (broadcast to days 0..n) and deviations z
+        n = self.n
+        x = np.zeros(self.n_x)
+        x[:n+1] = np.cumsum(np.broadcast_to(np.asarray(f_0, dtype=np.float64), (n+1,)))
+        if self.n_curves > 1 and pi is not None:
+            x[n+1:2*n+2] = np.cumsum(np.broadcast_to(np.asarray(pi, dtype=np.float64), (n+1,)))
+        if z is not None:
+            x[self.z_col[self.free]] = np.asarray(z, dtype=np.float64)[self.free]
+        return x
+
+    def z(self, x):
+        return np.where(self.z_col >= 0, x[self.z_col], 0.0)
+
+    def Phis(self, x):
+        # Prefix sums (curves, days) of f_0 and pi
+        return x[:self.n_curves*(self.n+1)].reshape(self.n_curves, self.n+1)
+
+    def gradient(self, x):
+        # G x, through f_0 = B Phi: the entries of G x cancel to far below those of G and x
+        B, Q = self.B, self.Q
+        return np.concatenate([B.T @ (Q @ (B @ Phi)) for Phi in self.Phis(x)]
+                              + [self.E[self.free]*x[self.n_curves*(self.n+1):]])
+
+    def constraints(self, x):
+        terms = discounting.term_values(self.Phis(x), self.terms, self.shift, self.z(x))
+        return terms.sum(axis=1), terms
+
+    def jacobian_t(self, terms, mu):
+        # J' mu, the constraint gradients weighted by mu
+        g = np.zeros(self.n_x)
+        weighted = mu[:, None, None]*discounting.term_derivatives(terms, self.terms)
+        g[:self.n_curves*(self.n+1)] = np.bincount(self.J_cols, weighted[self.factors],
+                                                   minlength=self.n_curves*(self.n+1))
+        g[self.z_col[self.free]] = -(mu[:, None]*terms*self.shift).sum(axis=1)[self.free]
+        return g
+
+    def kkt(self, terms, lam):
+        """
+        KKT matrix [[H, J'], [J, 0]] at the constraint terms of x and multipliers lam, with
+        J the exact constraint Jacobian (discounting.term_derivatives, and the shifts for
+        zOIS) and H the Hessian of the Lagrangian.
+        """
+        from scipy import sparse
+
+        coefs, free, z_col = self.terms.coefs, self.free, self.z_col
+        derivative = discounting.term_derivatives(terms, self.terms)
+        weighted = lam[:, None, None]*derivative
+        # Duplicates (e.g. Ti = TN) are summed by tocsc
+        J_rows, J_cols, J_vals = [self.J_rows], [self.J_cols], [derivative[self.factors]]
+        H_rows, H_cols = [self.H_rows], [self.H_cols]
+        H_vals = [(weighted[..., :, None]*coefs[..., None, :]/DAYS)[self.pairs]]
+        if len(free):
+            shift = self.shift[..., None]
+            J_rows.append(free)
+            J_cols.append(z_col[free])
+            J_vals.append(-(terms*self.shift).sum(axis=1)[free])
+            cross = (weighted*shift)[self.z_factors]
+            H_rows += [self.zf_rows, self.zf_cols, z_col[free]]
+            H_cols += [self.zf_cols, self.zf_rows, z_col[free]]
+            H_vals += [cross, cross, (-lam[:, None]*terms*self.shift**2).sum(axis=1)[free]]
+        shape = (self.n_contracts, self.n_x)
+        J = sparse.coo_matrix((np.concatenate(J_vals), (np.concatenate(J_rows),
+                               np.concatenate(J_cols))), shape=shape).tocsc()
+        H = self.G + sparse.coo_matrix((np.concatenate(H_vals), (np.concatenate(H_rows),
+                                        np.concatenate(H_cols))), shape=(self.n_x,)*2).tocsc()
+        return sparse.bmat([[H, J.T], [J, None]], format="csc")
+
+    def result(self, x, c, lam, iterations):
+        f_0, pi = (self.B @ Phi for Phi in self.Phis(x)) if self.n_curves > 1 else (
+            self.B @ x[:self.n+1], np.zeros(self.n+1))
+        z = self.z(x)[:len(self.E)]
+        return BNFit(f_0, pi, f_0 + pi, z, objective(f_0, pi, z, self.a, self.E, self.xi),
+                     iterations, float(np.abs(c).max()), lam)
+
+
+def fit(contracts, n=None, a=None, E=0.0, F=0.0, xi=XI, f_start=None, z_start=None,
+        lam_start=None, tol=1e-13, max_iter=50, tenor=None, pi_start=None):
+    """
+    Fit the Blomvall-Ndengo curve to the OIS `contracts` on days 0..n (by default the last
+    cashflow day) with penalty weights a (n values, default ones) and price deviation
+    parameters E and F (scalars or one per OIS; E = F = 0 reprices exactly). With tenor
+    contracts (TenorContracts, repriced exactly) the tenor spread pi is fitted as well.
+    f_start, pi_start, z_start and lam_start are the initial f_0, pi, z and multipliers, by
+    default f_0 flat at the mean OIS quote, pi flat at the mean tenor quote minus that and
+    zeros. Stops when the largest constraint residual is below tol and the Newton step
+    below sqrt(tol) relative to Phi, or when no step decreases the merit function any more,
+    and returns a BNFit.
+    """
+    from scipy.sparse import linalg
+
+    problem = _Problem(contracts, n, a, E, F, xi, tenor)
+    if f_start is None:
+        f_start = np.mean(contracts.p)
+    if pi_start is None and tenor is not None:
+        pi_start = np.mean(np.concatenate([tenor.deposits.L, tenor.swaps.p])) - np.mean(f_start)
+    x = problem.start(f_start, z_start, pi_start)
+    lam = (np.zeros(problem.n_contracts) if lam_start is None
+           else np.array(lam_start, dtype=np.float64))
+
+    c, terms = problem.constraints(x)
+    for iteration in range(1, max_iter+1):
+        g = problem.gradient(x)
+        step = linalg.spsolve(problem.kkt(terms, lam), -np.concatenate([g, c]))
+        dx, lam_new = step[:problem.n_x], -step[problem.n_x:]
+
+        # Backtracking on the l1 merit function obj + mu |c|_1, with the change of the
+        # quadratic objective t g'dx + t^2 dx'G dx/2 computed directly
+        mu = 2*np.abs(lam_new).max(initial=0.0) + 1.0
+        slope, curvature = g @ dx, dx @ problem.gradient(dx)
+        t, l1 = 1.0, np.abs(c).sum()
+        while True:
+            c_new, terms_new = problem.constraints(x + t*dx)
+            change = t*slope + t*t*curvature/2 + mu*(np.abs(c_new).sum() - l1)
+            if change <= 1e-4*t*(slope - mu*l1) or t < 1e-8:
+                break
+            t /= 2
+        x, c, terms, lam = x + t*dx, c_new, terms_new, lam + t*(lam_new - lam)
+        # Newton converges quadratically, so after a full step below sqrt(tol) the next one
+        # would be below tol. A step the line search rejects makes no progress (the residual
+        # is at the accuracy of the KKT solve), which also ends the fit
+        scale = max(1.0, np.abs(x).max())
+        if t < 1e-8 or np.abs(c).max() < tol and np.abs(t*dx).max() < np.sqrt(tol)*scale:
+            break
+
+    return problem.result(x, c, lam, iteration)
+
+
+def loo_range(contracts):
+    # Contracts that are left out: all but the first and the last, as for the tenor pillars
+    return range(1, len(contracts.p)-1)
+
+
+def loo_rates(contracts, result, a=None, E=0.0, F=0.0, xi=XI, js=None, tol=1e-13,
+              max_iter=20, tenor=None):
+    """
+    Leave-one-out par rates of the contracts js (default loo_range): rate j is the par rate
+    of contract j on the curve fitted to all the other contracts. `result` is the BNFit of
+    fit(contracts, n, a, E, F, xi, tenor=tenor), with n = len(result.f_0)-1 kept for every
+    curve (the tenor contracts are never left out).
+
+    Instead of one fit per left-out contract, the KKT matrix at `result` is factorized once.
+    Dropping constraint j removes one row and column of it, a rank-one correction of the
+    solves with the full factorization, so every reduced problem is solved by steps from
+    `result` on its KKT residual that only cost back substitutions. The steps converge
+    linearly at a rate of about 1e-3. Stops when the largest constraint residual is below tol
+    and the estimated distance to the solution below tol relative to Phi, and returns the
+    rates and the number of steps taken.
+    """
+    from scipy.sparse import linalg
+
+    problem = _Problem(contracts, len(result.f_0)-1, a, E, F, xi, tenor)
+    n_x = problem.n_x
+    js = np.asarray(loo_range(contracts) if js is None else js, dtype=np.int64)
+    cols = np.arange(len(js))
+    x = problem.start(result.f_0, result.z, result.pi)
+    lam = np.asarray(result.multipliers, dtype=np.float64)
+    lu = linalg.splu(problem.kkt(problem.constraints(x)[1], lam))
+
+    # W[:, k] = K^-1 e_r for the row r of the left-out constraint js[k]. A reduced solve is
+    # y = K^-1 b + s W[:, k] with s such that y[r] = 0, which leaves row r of K y = b free
+    r = n_x + js
+    e_r = np.zeros((n_x + problem.n_contracts, len(js)))
+    e_r[r, cols] = 1.0
+    W = lu.solve(e_r)
+
+    # Every column k starts from the full fit with the multiplier of js[k] set to zero (mu is
+    # minus the multipliers, in the sign convention of the KKT matrix)
+    X = np.repeat(x[:, None], len(js), axis=1)
+    step = 0.0
+    mu = np.repeat(-lam[:, None], len(js), axis=1)
+    mu[js, cols] = 0.0
+    for iteration in range(1, max_iter+1):
+        b = np.empty_like(W)
+        for k in cols:
+            c, terms = problem.constraints(X[:, k])
+            b[:n_x, k] = -problem.gradient(X[:, k]) - problem.jacobian_t(terms, mu[:, k])
+            b[n_x:, k] = -c
+        b[r, cols] = 0.0
+        residual = np.abs(b[n_x:]).max()
+        y = lu.solve(b)
+        y -= W*(y[r, cols]/W[r, cols])
+        X += y[:n_x]
+        mu += y[n_x:]
+        # The steps shrink linearly by about `rate`, so the distance left to the solution is
+        # about rate/(1-rate) of the last step
+        step, rate = np.abs(y[:n_x]).max(), np.abs(y[:n_x]).max()/max(step, 1e-300)
+        if residual < tol and rate*step < (1-rate)*tol*max(1.0, np.abs(X).max()):
+            break
+
+    Phi = X[:problem.n+1]
+    return np.array([discounting.ois_rates(Phi[:, k], contracts)[j]
+                     for k, j in enumerate(js)]), iteration
+
+
+def shifted(f, elapsed, n):
+    # Daily values f on days 0.. seen `elapsed` days later, on days 0..n: the first elapsed
+    # days drop out and the last value is extended to the new horizon
+    f = np.asarray(f, dtype=np.float64)
+    kept = f[elapsed:elapsed+n+1]
+    return np.concatenate([kept, np.full(n+1-len(kept), f[-1])])
+
+
+def fit_history(serials, ratess, tenors, settlement_days=2, calendar=None, dayCounter=None,
+                a=None, E=0.0, F=0.0, xi=XI, warm_start=True, tol=1e-13, max_iter=50,
+                layout=None, IBOR_ratess=None, IRS_ratess=None):
+    """
+    Generator of BNDate, fitting the OIS quotes ratess[k] (decimals, at `tenors`) of every
+    valuation date serials[k] (QuantLib serial numbers) in date order, oldest first. With a
+    bootstrap.CurveLayout and its IBOR and IRS quotes per date, the tenor curve is fitted as
+    well (tenor_contracts). Each date runs on days 0..its last cashflow day and, with
+    warm_start, starts from the previous date's f_0, pi and z, shifted by the days elapsed
+    between the two dates, and from its multipliers. a is a function of the horizon n
+    returning the n penalty weights (default ones).
+    """
+    import time
+
+    previous = None
+    for k in np.argsort(serials, kind="stable"):
+        serial = int(serials[k])
+        contracts = ois_contracts(ql.Date(serial), tenors, ratess[k], settlement_days,
+                                  calendar, dayCounter)
+        tenor = None
+        if layout is not None:
+            tenor = tenor_contracts(layout, serial, IBOR_ratess[k], IRS_ratess[k])
+        n = int(_Problem(contracts, tenor=tenor).terms.days.max())
+        start = {}
+        if warm_start and previous is not None:
+            elapsed = serial - previous.serial
+            start = {"f_start": shifted(previous.fit.f_0, elapsed, n),
+                     "z_start": previous.fit.z, "lam_start": previous.fit.multipliers}
+            if tenor is not None:
+                start["pi_start"] = shifted(previous.fit.pi, elapsed, n)
+        t = time.perf_counter()
+        result = fit(contracts, n, None if a is None else a(n), E, F, xi, tol=tol,
+                     max_iter=max_iter, tenor=tenor, **start)
+        previous = BNDate(serial, contracts, tenor, result, time.perf_counter() - t)
+        yield previous
+
+
+def loo_errors(date, a=None, E=0.0, F=0.0, xi=XI):
+    """
+    Leave-one-out errors of one BNDate of fit_history, for the contracts in loo_range: the
+    par rate of each on the curve without it (loo_rates) minus that on the full curve,
+    which is the quote when E = F = 0.
+    """
+    n = len(date.fit.f_0)-1
+    js = np.array(loo_range(date.contracts))
+    rates = loo_rates(date.contracts, date.fit, None if a is None else a(n), E, F, xi, js,
+                      tenor=date.tenor)[0]
+    return rates - ois_rates(date.fit.f_0, date.contracts)[js]
+
+
+# loo_sweep rows: the left-out OIS tenor and its par rate error
+
+OIS_SWEEP_COLUMNS = ["valuation_date", "tenor", "method", "dX_OIS"]
+
+
+def loo_sweep(serials, ratess, tenors, settlement_days=2, calendar=None, dayCounter=None,
+              a=None, E=0.0, F=0.0, xi=XI, verbose=False, layout=None, IBOR_ratess=None,
+              IRS_ratess=None):
+    """
+    loo_errors of every valuation date serials[k] with OIS quotes ratess[k] at `tenors` (and
+    the tenor instruments of fit_history when a layout is given), as a DataFrame with
+    OIS_SWEEP_COLUMNS in the order of serials and method LABEL. The errors are OIS par rate
+    errors of the left-out OIS tenors[1:-1], not the IRS errors of loo.loo_sweep, so they
+    are in a dX_OIS column instead of dX_IRS; loo.sweep_panel(sweep, LABEL,
+    values="dX_OIS") gives them as a dates x tenors panel.
+    """
+    import pandas as pd
+
+    from termstructure import loo
+
+    dX = {}
+    for date in fit_history(serials, ratess, tenors, settlement_days, calendar, dayCounter,
+                            a, E, F, xi, layout=layout, IBOR_ratess=IBOR_ratess,
+                            IRS_ratess=IRS_ratess):
+        dX[date.serial] = loo_errors(date, a, E, F, xi)
+        if verbose:
+            print(ql.Date(date.serial), " done.")
+
+    columns = list(tenors)[1:-1] # loo_range
+    dates = [loo.ql_to_datetime(ql.Date(int(serial))) for serial in serials]
+    return pd.DataFrame({"valuation_date": np.repeat(dates, len(columns)),
+                         "tenor": np.tile(columns, len(serials)),
+                         "method": LABEL,
+                         "dX_OIS": np.concatenate([dX[int(serial)] for serial in serials])},
+                        columns=OIS_SWEEP_COLUMNS)
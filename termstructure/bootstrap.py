@@ -0,0 +1,375 @@
+"""
+Bootstrapping of the OIS (risk-free) and tenor curves, one valuation date at a time.
+
+Each date only depends on its own quotes and on the global QuantLib evaluation date, so the
+date range is sharded across a process pool. Every worker sets its own evaluation date and
+the per-date pillars are merged back in date order. Only serial numbers and floats cross
+the process boundary, since QuantLib objects cannot be pickled. Within a process the
+helpers are built once per layout (CurveBuilder) and only re-quoted per date, the curves on
+them are rebuilt per date.
+"""
+
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+import QuantLib as ql
+
+from termstructure import calendars
+
+settlementDays = 2
+fixingDays = 0
+
+# With True the OIS helpers only keep the first and last value date of each compounding
+# period instead of one per business day. Forecasting from the curve being bootstrapped the
+# daily factors telescope, so the pillars only move by about 1e-12, while building the
+# helpers (which QuantLib redoes whenever the evaluation date moves) gets much cheaper.
+# False is the helper definition of the thesis, whose pillars it reproduces.
+
+telescopicValueDates = False
+
+# Bump whenever the helpers or the extracted pillars change, so that stored pillars
+# (see pillars.bootstrap_store) are not reused across incompatible versions.
+
+HELPERS_VERSION = 4
+
+# Control mode checks the OIS flat forwards derived from the zero curve (flat_forwards)
+# against a bootstrapped flat forward curve. Both control curves are bootstrapped to
+# CONTROL_ACCURACY, so that they agree far below FLAT_FORWARD_TOLERANCE unless the
+# derivation is wrong (QuantLib's default accuracy alone gives differences up to 1e-11).
+
+CONTROL_ACCURACY = 1e-15
+FLAT_FORWARD_TOLERANCE = 1e-12
+
+# Name of the overnight index and name/tenor of the IBOR index for each market
+
+ON_INDEX = {"SEK": "STINA", "EUR": "EONIA"}
+IBOR_INDEX = {"SEK": ("STIBOR", "3m"), "EUR": ("EURIBOR", "6m")}
+
+# Tenors of the quoted instruments. IBOR tenors are in QuantLib format ("1D" instead of "ON").
+
+CurveLayout = collections.namedtuple(
+    "CurveLayout", ["currency", "ois_tenors", "irs_tenors", "ibor_tenors"])
+
+# Bootstrapped pillars for one valuation date. Dates are QuantLib serial numbers and include
+# the valuation date itself as the first pillar, as returned by curve.dates().
+
+DatePillars = collections.namedtuple(
+    "DatePillars", ["valuation_date",
+                    "ois_dates", "ois_pillars", "ois_f_pillars", "ois_year_fracs",
+                    "tenor_dates", "tenor_pillars", "tenor_fwdPillars", "tenor_year_fracs"])
+
+
+def conventions(currency):
+    # calendar, currency, day count of the curves and day count of the pillar year fractions
+    if currency == "SEK":
+        return ql.Sweden(), ql.SEKCurrency(), ql.Actual360(), ql.ActualActual(ql.ActualActual.ISMA)
+    elif currency == "EUR":
+        return ql.TARGET(), ql.EURCurrency(), ql.Actual365Fixed(), ql.ActualActual(ql.ActualActual.ISMA)
+    raise ValueError("Unknown currency: "+currency)
+
+
+def helper_config(layout):
+    # Everything that determines the bootstrapped pillars apart from the quotes
+    iborIndex_name, iborIndex_tenor = IBOR_INDEX[layout.currency]
+    return {"version": HELPERS_VERSION,
+            "currency": layout.currency,
+            "ois_index": ON_INDEX[layout.currency],
+            "ibor_index": iborIndex_name+iborIndex_tenor.upper(),
+            "ois_tenors": list(layout.ois_tenors),
+            "irs_tenors": list(layout.irs_tenors),
+            "ibor_tenors": list(layout.ibor_tenors),
+            "settlementDays": settlementDays,
+            "fixingDays": fixingDays,
+            "telescopicValueDates": telescopicValueDates}
+
+
+def ql_tenor(tenor):
+    return "1D" if tenor == "ON" else tenor
+
+
+def to_serial(dates):
+    # datetime64 dates to QuantLib serial numbers (days since 30 December 1899)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    return days + 25569
+
+
+def market_rates(currency, dfs):
+    """
+    Layout, valuation dates (serial numbers) and mid rates in decimals from the aligned
+    quote frames [OIS bid, IRS bid, OIS ask, IRS ask, IBOR] (see quotes.load_panel).
+    """
+    df_OIS_bid, df_IRS_bid, df_OIS_ask, df_IRS_ask, df_IBOR = dfs
+    layout = CurveLayout(currency,
+                         [str(c) for c in df_OIS_bid.columns[1:]],
+                         [str(c) for c in df_IRS_bid.columns[1:]],
+                         [ql_tenor(str(c)) for c in df_IBOR.columns[1:]])
+    OIS_ratess = ((df_OIS_bid.iloc[:,1:].values/100 + df_OIS_ask.iloc[:,1:].values/100)/2).tolist()
+    IRS_ratess = ((df_IRS_bid.iloc[:,1:].values/100 + df_IRS_ask.iloc[:,1:].values/100)/2).tolist()
+    IBOR_ratess = (df_IBOR.iloc[:,1:].values/100).tolist()
+    return layout, to_serial(df_OIS_bid.iloc[:,0].values), OIS_ratess, IRS_ratess, IBOR_ratess
+
+
+class CurveBuilder:
+    """
+    The QuantLib helper graph of one curve layout, built once and reused for every date.
+
+    Indices, swap indices and rate helpers are constructed in __init__ on SimpleQuotes, so
+    a new date only moves the evaluation date and sets the quotes, and QuantLib recomputes
+    the helper dates. The curves on the helpers are rebuilt for every date (cheap next to
+    the helpers), since a re-quoted curve starts its bootstrap from the previous date's
+    pillars and so only reproduces the thesis pillars to the solver accuracy.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        calendar, qlCurrency, dayConvention, fracConvention = conventions(layout.currency)
+        self.fracConvention = fracConvention
+
+        # OIS:
+
+        ONindex_name = ON_INDEX[layout.currency]
+        self.ONindex = ql.OvernightIndex(ONindex_name, settlementDays,
+                                         qlCurrency, calendar, dayConvention)
+        self.ois_quotes = [ql.SimpleQuote(0.0) for tenor in layout.ois_tenors]
+        self.ois_helpers = [ql.OISRateHelper(settlementDays, ql.Period(tenor),
+                                             ql.QuoteHandle(quote), self.ONindex,
+                                             ql.YieldTermStructureHandle(), telescopicValueDates)
+                            for tenor, quote in zip(layout.ois_tenors, self.ois_quotes)]
+
+        self.discount_curve_ois = ql.RelinkableYieldTermStructureHandle()
+
+        # IBOR:
+
+        businessConvention = ql.ModifiedFollowing
+        self.ibor_quotes = [ql.SimpleQuote(0.0) for tenor in layout.ibor_tenors]
+        self.ibor_helpers = [ql.DepositRateHelper(ql.QuoteHandle(quote),
+                                                  ql.Period(tenor), fixingDays,
+                                                  calendar, businessConvention,
+                                                  True, dayConvention)
+                             for tenor, quote in zip(layout.ibor_tenors, self.ibor_quotes)]
+
+        # IRS:
+
+        fixedLegTenor = ql.Period(1, ql.Years)
+        fixedLegConvention = ql.ModifiedFollowing
+        fixedLegDayCounter = ql.Thirty360(ql.Thirty360.BondBasis)
+        iborIndex_name, iborIndex_tenor = IBOR_INDEX[layout.currency]
+        self.iborIndex = ql.IborIndex(iborIndex_name, ql.Period(iborIndex_tenor),
+                                      settlementDays, qlCurrency,
+                                      calendar, fixedLegConvention,
+                                      True, dayConvention)
+        self.swapIndices = [ql.SwapIndex(iborIndex_name, ql.Period(tenor), settlementDays,
+                                         qlCurrency, calendar,
+                                         fixedLegTenor, fixedLegConvention, fixedLegDayCounter,
+                                         self.iborIndex, self.discount_curve_ois)
+                            for tenor in layout.irs_tenors]
+        self.irs_quotes = [ql.SimpleQuote(0.0) for tenor in layout.irs_tenors]
+        self.irs_helpers = [ql.SwapRateHelper(ql.QuoteHandle(quote), swapIndex)
+                            for quote, swapIndex in zip(self.irs_quotes, self.swapIndices)]
+
+        self.tenor_helpers = self.ibor_helpers + self.irs_helpers
+        self.dayConvention = dayConvention
+
+    def build_curves(self):
+        # The curves on the helpers, floating with the evaluation date (zero settlement days
+        # on a null calendar, so their reference date is the valuation date)
+        dayConvention = self.dayConvention
+        self.ON_curve = ql.PiecewiseLinearZero(0, ql.NullCalendar(), self.ois_helpers, dayConvention)
+        self.ON_curve.enableExtrapolation() # Not extrapolating, just to avoid getting max pillar error
+        self.discount_curve_ois.linkTo(self.ON_curve)
+        self.tenor_spotCurve = ql.PiecewiseLinearZero(0, ql.NullCalendar(), self.tenor_helpers, dayConvention)
+        self.tenor_spotCurve.enableExtrapolation()
+        self.tenor_forwardCurve = ql.PiecewiseFlatForward(0, ql.NullCalendar(), self.tenor_helpers, dayConvention)
+        self.tenor_forwardCurve.enableExtrapolation()
+
+    def bootstrap(self, serial, OIS_rates, IRS_rates, IBOR_rates, control=False):
+        valuation_date = ql.Date(int(serial))
+        ql.Settings.instance().evaluationDate = valuation_date
+        for quotes, rates in ((self.ois_quotes, OIS_rates), (self.ibor_quotes, IBOR_rates),
+                              (self.irs_quotes, IRS_rates)):
+            for quote, rate in zip(quotes, rates):
+                quote.setValue(float(rate))
+        self.build_curves()
+
+        # Nodes include dates so we extract pillars. The OIS flat forwards are derived from
+        # the zero curve instead of bootstrapping ON_curve_f (see flat_forwards).
+
+        fracConvention = self.fracConvention
+        ois_dates = self.ON_curve.dates()
+        tenor_dates = self.tenor_spotCurve.dates()
+        ois_pillars = [node[1] for node in self.ON_curve.nodes()]
+        pillars = DatePillars(
+            int(serial),
+            [dt.serialNumber() for dt in ois_dates],
+            ois_pillars,
+            flat_forwards(self.ON_curve.times(), ois_pillars).tolist(),
+            calendars.year_fractions(fracConvention, [serial]*len(ois_dates),
+                                     [dt.serialNumber() for dt in ois_dates]).tolist(),
+            [dt.serialNumber() for dt in tenor_dates],
+            [node[1] for node in self.tenor_spotCurve.nodes()],
+            [node[1] for node in self.tenor_forwardCurve.nodes()],
+            calendars.year_fractions(fracConvention, [serial]*len(tenor_dates),
+                                     [dt.serialNumber() for dt in tenor_dates]).tolist())
+
+        if control:
+            print_control(self.layout, valuation_date, self.ON_curve, self.tenor_spotCurve,
+                          pillars, OIS_rates, IRS_rates)
+            # Both bootstrapped to CONTROL_ACCURACY (see check_flat_forwards)
+            ON_curve_z = ql.PiecewiseLinearZero(0, ql.NullCalendar(), self.ois_helpers,
+                                                self.dayConvention,
+                                                ql.IterativeBootstrap(CONTROL_ACCURACY))
+            ON_curve_f = ql.PiecewiseFlatForward(0, ql.NullCalendar(), self.ois_helpers,
+                                                 self.dayConvention,
+                                                 ql.IterativeBootstrap(CONTROL_ACCURACY))
+            ON_curve_f.enableExtrapolation()
+            check_flat_forwards(ON_curve_z, ON_curve_f)
+        return pillars
+
+
+def flat_forwards(times, zero_rates):
+    """
+    Flat forward pillars of a linear-zero curve from its zero-rate pillars (continuous
+    compounding, times in the curve's day count): the forward on (t[i-1], t[i]] is
+    (z[i]t[i] - z[i-1]t[i-1])/(t[i] - t[i-1]), and the first pillar repeats the second,
+    as in the nodes of ql.PiecewiseFlatForward.
+
+    The pillars of both curves follow from the discount factors at the pillar dates, so this
+    equals the pillars of a PiecewiseFlatForward bootstrapped on the same helpers whenever
+    every helper only depends on discount factors at pillar dates and in the first segment
+    (where both curves have a flat forward). That holds for the OIS helpers (spot date
+    before the first pillar, coupon dates on pillar dates), and there the two agree to the
+    solver accuracy: about 1e-11 at QuantLib's default accuracy, and below 1e-14 when both
+    are bootstrapped to CONTROL_ACCURACY (check_flat_forwards, in control mode). It does not hold for the tenor curve, whose swaps start
+    on the spot date after the 1D deposit pillar, so both tenor curves are still
+    bootstrapped. Works on stacked (..., pillars) arrays.
+    """
+    t = np.asarray(times, dtype=np.float64)
+    zt = np.asarray(zero_rates, dtype=np.float64)*t
+    f = np.empty_like(zt)
+    f[..., 1:] = np.diff(zt)/np.diff(t)
+    f[..., 0] = f[..., 1]
+    return f
+
+
+def check_flat_forwards(ON_curve, ON_curve_f, tol=FLAT_FORWARD_TOLERANCE):
+    # Raises RuntimeError if flat_forwards of the linear-zero OIS curve differ from the
+    # pillars of the flat forward curve bootstrapped on the same helpers by more than tol
+    derived = flat_forwards(ON_curve.times(), [node[1] for node in ON_curve.nodes()])
+    bootstrapped = np.array([node[1] for node in ON_curve_f.nodes()])
+    diff = np.abs(derived - bootstrapped).max()
+    unit = 100*100 # bp *100 %
+    print("OIS flat forwards derived from the zero curve vs bootstrapped: max diff",
+          f"{unit*diff: 0.3e} bp \n")
+    if not diff <= tol:
+        raise RuntimeError("OIS flat forwards derived from the zero curve differ from the "
+                           "bootstrapped ones by "+str(diff))
+
+
+# One builder per layout and process, so pool workers keep theirs between shards
+
+_builders = {}
+
+
+def curve_builder(layout):
+    key = (layout.currency, tuple(layout.ois_tenors), tuple(layout.irs_tenors),
+           tuple(layout.ibor_tenors))
+    if key not in _builders:
+        _builders[key] = CurveBuilder(layout)
+    return _builders[key]
+
+
+def bootstrap_date(layout, serial, OIS_rates, IRS_rates, IBOR_rates, control=False):
+    return curve_builder(layout).bootstrap(serial, OIS_rates, IRS_rates, IBOR_rates, control)
+
+
+def print_control(layout, valuation_date, ON_curve, tenor_spotCurve, pillars, OIS_rates, IRS_rates):
+    # Reprice the quoted OIS and IRS on the bootstrapped curves and on curves rebuilt from
+    # the pillars only (the latter are what the statistical tests use).
+    calendar, qlCurrency, dayConvention, fracConvention = conventions(layout.currency)
+    unit = 100*100 # bp *100 %
+    ois_dates = [ql.Date(d) for d in pillars.ois_dates]
+    tenor_dates = [ql.Date(d) for d in pillars.tenor_dates]
+    discount_curve_ois = ql.YieldTermStructureHandle(ON_curve)
+    tenor_termStructure = ql.YieldTermStructureHandle(tenor_spotCurve)
+    pillar_oisTermStructure = ql.YieldTermStructureHandle(
+        ql.ZeroCurve(ois_dates, pillars.ois_pillars, dayConvention))
+    pillar_tenorTermStructure = ql.YieldTermStructureHandle(
+        ql.ZeroCurve(tenor_dates, pillars.tenor_pillars, dayConvention))
+
+    ONindex_name = ON_INDEX[layout.currency]
+    overnightIndex = ql.OvernightIndex(ONindex_name, settlementDays, qlCurrency, calendar,
+                                       dayConvention, discount_curve_ois)
+    pillar_overnightIndex = ql.OvernightIndex(ONindex_name, settlementDays, qlCurrency, calendar,
+                                              dayConvention, pillar_oisTermStructure)
+    iborIndex_name, iborIndex_tenor = IBOR_INDEX[layout.currency]
+    index = ql.IborIndex(iborIndex_name, ql.Period(iborIndex_tenor), settlementDays, qlCurrency,
+                         calendar, ql.ModifiedFollowing, True, dayConvention, tenor_termStructure)
+    pillar_index = ql.IborIndex(iborIndex_name, ql.Period(iborIndex_tenor), settlementDays, qlCurrency,
+                                calendar, ql.ModifiedFollowing, True, dayConvention,
+                                pillar_tenorTermStructure)
+
+    print(valuation_date, "below:")
+    print("OIS from "+layout.currency+" curve.")
+    print(f"{'Maturity':^12}\t{' Fair rate'}\t{' Quoted rate'}\t{' Error'}\t\t{' Pillar f. rate'}\t{' Pillar error'}")
+    for tenor, rate in zip(layout.ois_tenors, OIS_rates):
+        ois = ql.MakeOIS(ql.Period(tenor), overnightIndex, 0,
+                         pricingEngine=ql.DiscountingSwapEngine(discount_curve_ois))
+        pillar_ois = ql.MakeOIS(ql.Period(tenor), pillar_overnightIndex, 0,
+                                pricingEngine=ql.DiscountingSwapEngine(pillar_oisTermStructure))
+        print(f"{tenor:^12}\t{unit*ois.fairRate(): 0.6f} bp\t{unit*rate: 0.6f} bp\t{unit*abs(ois.fairRate() - rate): 0.6f} bp\t{unit*pillar_ois.fairRate(): 0.6f}\t{unit*abs(pillar_ois.fairRate() - rate): 0.6f} bp")
+
+    print("IRS from "+layout.currency+" curve.")
+    print(f"{'Maturity':^12}\t{' Fair rate'}\t{' Quoted rate'}\t{' Error'}\t\t{' Pillar f.rate'}\t{' Pillar error'}")
+    for tenor, rate in zip(layout.irs_tenors, IRS_rates):
+        swap = ql.MakeVanillaSwap(ql.Period(tenor), index, 0.01, ql.Period('0D'),
+                                  pricingEngine=ql.DiscountingSwapEngine(tenor_termStructure))
+        pillar_swap = ql.MakeVanillaSwap(ql.Period(tenor), pillar_index, 0.01, ql.Period('0D'),
+                                         pricingEngine=ql.DiscountingSwapEngine(pillar_tenorTermStructure))
+        print(f"{tenor:^12}\t{unit*swap.fairRate(): 0.6f} bp\t{unit*rate: 0.6f} bp\t{unit*abs(swap.fairRate() - rate): 0.6f} bp\t{unit*pillar_swap.fairRate(): 0.6f}\t{unit*abs(pillar_swap.fairRate() - rate): 0.6f} bp")
+    print(" \n")
+
+
+def _bootstrap_chunk(layout, serials, OIS_ratess, IRS_ratess, IBOR_ratess, control):
+    return [bootstrap_date(layout, serial, OIS_rates, IRS_rates, IBOR_rates, control)
+            for serial, OIS_rates, IRS_rates, IBOR_rates
+            in zip(serials, OIS_ratess, IRS_ratess, IBOR_ratess)]
+
+
+def bootstrap_history(layout, serials, OIS_ratess, IRS_ratess, IBOR_ratess,
+                      processes=None, chunks_per_process=4, control=False, verbose=False):
+    """
+    Bootstrap every valuation date in `serials` and return the DatePillars in the same order.
+
+    The dates are cut into contiguous shards, a few per process so that slow shards even
+    out. processes=1 runs everything in this process, which is also what happens when
+    control output is requested, so that it is printed in date order.
+    """
+    N = len(serials)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, N)
+    if processes <= 1 or control:
+        results = []
+        for k in range(0, N):
+            results.append(bootstrap_date(layout, serials[k], OIS_ratess[k], IRS_ratess[k],
+                                          IBOR_ratess[k], control))
+            if verbose:
+                print(ql.Date(int(serials[k])), " done.")
+        return results
+
+    n_chunks = min(N, processes*chunks_per_process)
+    bounds = np.linspace(0, N, n_chunks+1).astype(int)
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_bootstrap_chunk, layout,
+                               list(serials[a:b]), list(OIS_ratess[a:b]),
+                               list(IRS_ratess[a:b]), list(IBOR_ratess[a:b]), False)
+                   for a, b in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            chunk = future.result()
+            results.extend(chunk)
+            if verbose:
+                print(ql.Date(chunk[-1].valuation_date), " done,", len(results), "of", N, "dates.")
+    return results
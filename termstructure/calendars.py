@@ -0,0 +1,184 @@
+"""
+Shared LRU caches for calendar and day-count work.
+
+The same calendar advances, year fractions and swap schedules are asked for in the
+bootstrap, interpolation and LOO stages, and again whenever a stage is rerun. They are
+cached here by (calendar or day counter name, serial numbers, ...), bounded in size, with
+hit/miss counters for every cache (cache_info). QuantLib objects are looked up by name, so
+the keys are plain tuples.
+"""
+
+import functools
+
+import numpy as np
+import QuantLib as ql
+
+MAXSIZE = 1 << 16
+
+_caches = {}
+_calendars = {}
+_day_counters = {}
+
+
+def lru(name, maxsize=MAXSIZE):
+    # functools.lru_cache, registered under `name` for cache_info and cache_clear
+    def decorate(f):
+        cached = functools.lru_cache(maxsize=maxsize)(f)
+        _caches[name] = cached
+        return cached
+    return decorate
+
+
+def cache_info():
+    # {cache name: (hits, misses, maxsize, currsize)}
+    return {name: cached.cache_info() for name, cached in _caches.items()}
+
+
+def print_cache_info():
+    for name, info in cache_info().items():
+        print(f"{name:<22}{info.hits:>10} hits{info.misses:>10} misses{info.currsize:>10} cached")
+
+
+def cache_clear():
+    for cached in _caches.values():
+        cached.cache_clear()
+
+
+def calendar_key(calendar):
+    _calendars.setdefault(calendar.name(), calendar)
+    return calendar.name()
+
+
+def day_counter_key(dayCounter):
+    _day_counters.setdefault(dayCounter.name(), dayCounter)
+    return dayCounter.name()
+
+
+@lru("advance")
+def _advance(calendar_name, serial, n, unit, convention, endOfMonth):
+    return _calendars[calendar_name].advance(ql.Date(serial), n, unit, convention,
+                                             endOfMonth).serialNumber()
+
+
+def advance(calendar, serials, n, unit=ql.Days, convention=ql.Following, endOfMonth=False):
+    # calendar.advance of each serial number, by n units (one n for all or one per serial)
+    name = calendar_key(calendar)
+    ns = np.broadcast_to(n, (len(serials),))
+    return [_advance(name, int(serial), int(k), unit, convention, endOfMonth)
+            for serial, k in zip(serials, ns)]
+
+
+@lru("fixing_value_date")
+def _fixing_value_date(calendar_name, serial, fixingDays):
+    fixingDate = _advance(calendar_name, serial, -fixingDays, ql.Days, ql.Following, False)
+    return _advance(calendar_name, fixingDate, fixingDays, ql.Days, ql.Following, False)
+
+
+def fixing_value_dates(calendar, serials, fixingDays):
+    # Value date of the fixing of a period starting on each serial: moved fixingDays back to
+    # the fixing date and forward again on the fixing calendar
+    name = calendar_key(calendar)
+    return [_fixing_value_date(name, int(serial), fixingDays) for serial in serials]
+
+
+@lru("year_fraction")
+def _year_fraction(day_counter_name, d0, d1):
+    return _day_counters[day_counter_name].yearFraction(ql.Date(d0), ql.Date(d1))
+
+
+def year_fractions(dayCounter, d0s, d1s):
+    # dayCounter.yearFraction of each pair of serial numbers
+    name = day_counter_key(dayCounter)
+    return np.array([_year_fraction(name, int(d0), int(d1)) for d0, d1 in zip(d0s, d1s)])
+
+
+# Year fractions from a start date that only depend on the number of days, for the day
+# counters with such a closed form: (starts (dates, 1) serial numbers, days (dates, points))
+# -> year fractions, with the same floating-point operations as QuantLib's yearFraction.
+
+
+def _actual_fixed(basis):
+    return lambda starts, days: days/basis
+
+
+def _actual_actual_isma(starts, days):
+    # ActualActual ISMA without a reference period: the period from start to end is its own
+    # reference period of round(12*days/365) months, or the year from start when that rounds
+    # to zero months
+    months = np.floor(12*days/365 + 0.5)
+    year = np.array([(ql.Date(int(start)) + ql.Period(1, ql.Years)).serialNumber() - int(start)
+                     for start in starts.ravel()], dtype=np.float64).reshape(starts.shape)
+    short = months == 0
+    fracs = np.where(short, 1.0, months/12.0)*days/np.where(short, year, days)
+    return np.where(days == 0, 0.0, fracs)
+
+
+_DAILY_KERNELS = {
+    "Actual/360": _actual_fixed(360.0),
+    "Actual/365 (Fixed)": _actual_fixed(365.0),
+    "Actual/Actual (ISMA)": _actual_actual_isma,
+}
+
+
+def year_fractions_from(dayCounter, starts, serials):
+    """
+    dayCounter.yearFraction(starts[X], serials[X, ...]) for the start dates `starts`
+    (dates,) and any (dates, ...) array of serial numbers from them, in one closed-form
+    call for the day counters in _DAILY_KERNELS, else from the cached pairs.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    serials = np.asarray(serials, dtype=np.int64)
+    name = day_counter_key(dayCounter)
+    days = (serials.reshape(len(starts), -1) - starts[:, None]).astype(np.float64)
+    if name in _DAILY_KERNELS:
+        with np.errstate(invalid="ignore"):
+            fracs = _DAILY_KERNELS[name](starts[:, None], days)
+    else:
+        fracs = np.array([[_year_fraction(name, int(start), int(start + d)) for d in row]
+                          for start, row in zip(starts, days)]).reshape(days.shape)
+    return fracs.reshape(serials.shape)
+
+
+@lru("daily_year_fractions", maxsize=1 << 12)
+def _daily_year_fractions(day_counter_name, start, end):
+    if day_counter_name in _DAILY_KERNELS:
+        days = np.arange(end - start + 1, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            fracs = _DAILY_KERNELS[day_counter_name](np.array([start]), days)
+    else:
+        fracs = np.array([_day_counters[day_counter_name].yearFraction(ql.Date(start), ql.Date(d))
+                          for d in range(start, end+1)])
+    fracs.flags.writeable = False
+    return fracs
+
+
+def daily_year_fractions(dayCounter, start, end):
+    """
+    Year fractions from `start` of every calendar day from `start` to `end` (serial numbers),
+    the grid of ql.MakeSchedule(start, end, ql.Period('1D')). Read-only array.
+    """
+    return _daily_year_fractions(day_counter_key(dayCounter), int(start), int(end))
+
+
+def daily_grid(dayCounter, starts, ends, n_days=None):
+    """
+    daily_year_fractions of many dates as one (dates, days) array, padded with NaN after
+    each end (to n_days columns if given): column d is the year fraction of the day d days
+    after the start. Computed for all dates at once for the day counters in
+    _DAILY_KERNELS, else from the cached rows.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(ends, dtype=np.int64) - starts + 1
+    if n_days is None:
+        n_days = lengths.max(initial=0)
+    name = day_counter_key(dayCounter)
+    days = np.broadcast_to(np.arange(n_days, dtype=np.float64), (len(starts), n_days))
+    if name in _DAILY_KERNELS:
+        with np.errstate(invalid="ignore"):
+            grid = _DAILY_KERNELS[name](starts[:, None], days)
+        grid[days >= lengths[:, None]] = np.nan
+        return grid
+    grid = np.full(days.shape, np.nan)
+    for X, (start, n) in enumerate(zip(starts, lengths)):
+        grid[X, :n] = _daily_year_fractions(name, int(start), int(start + n - 1))
+    return grid
@@ -0,0 +1,137 @@
+"""
+Prefix-sum discounting on a daily forward curve, for the Blomvall-Ndengo model.
+
+The discount factor to day T in opt5.mod is exp(-sum_{t=0..T} f[t]/365). With the prefix
+sums Phi = cumsum(f) computed once per curve, every discount factor is the lookup
+exp(-Phi[T]/365), so pricing costs O(cashflows) instead of O(cashflows x days).
+
+Contracts are blomvall_ndengo.OISContracts (T0, TN, Ti, dt, p), with days counted from
+the valuation date.
+
+With the tenor instruments of blomvall_ndengo.TenorContracts the tenor curve f_0 + pi
+enters as well (prefix sums Phi + Pi), and every pricing constraint is a sum of Terms:
+exponentials of a few signed prefix-sum entries of the two curves, e.g. one floating IRS
+coupon D_tenor(start)/D_tenor(end) D(payment). The exact constraint Jacobian with respect
+to the prefix sums (and the deviations zOIS) has one nonzero per factor of a term
+(term_derivatives), which blomvall_ndengo._Problem assembles into the sparse Jacobian and
+Hessian of the SQP solver; the solver works on the prefix sums, so there is no dense
+Jacobian with respect to the daily forwards.
+"""
+
+import collections
+
+import numpy as np
+
+DAYS = 365 # day basis of the discount factors in opt5.mod
+OIS, SPREAD = 0, 1 # curves of Terms: the OIS forwards f_0 and the tenor spread pi
+
+# Constraint i is sum_k weights[i, k] exp(-sum_w coefs[i, k, w] Phis[curves[i, k, w],
+# days[i, k, w]]/365), with Phis the prefix sums of the curves. Padding terms have weight
+# zero and padding factors coefficient zero.
+
+Terms = collections.namedtuple("Terms", ["days", "curves", "coefs", "weights"])
+
+
+def prefix_sums(f):
+    # Phi[T] = sum_{t=0..T} f[t], along the last axis
+    return np.cumsum(f, axis=-1)
+
+
+def cashflows(contracts):
+    """
+    (days, weights) of the OIS constraints: constraint i is sum_k weights[i, k] D(days[i, k]),
+    with the settlement (+1), the maturity (-1) and the fixed payments (-p dt) as the
+    columns. The padding payments have weight zero.
+    """
+    T0, TN, Ti, dt, p = contracts
+    days = np.column_stack([T0, TN, Ti])
+    weights = np.column_stack([np.ones(len(p)), -np.ones(len(p)), -p[:, None]*dt])
+    return days, weights
+
+
+def shifts(days, F):
+    # d u / d z of the exponent u = (Phi[day] + (day+1) F z)/365 of every cashflow
+    return (days + 1)*np.asarray(F, dtype=np.float64)[..., None]/DAYS
+
+
+def ois_rates(Phi, contracts):
+    # Par rates of the contracts on the curve with prefix sums Phi (OIS_price of the script)
+    T0, TN, Ti, dt, p = contracts
+    D = lambda days: np.exp(-Phi[days]/DAYS)
+    return (D(T0) - D(TN))/np.sum(dt*D(Ti), axis=1)
+
+
+def ois_terms(contracts):
+    # The OIS constraints (cashflows) as Terms on the OIS curve
+    days, weights = cashflows(contracts)
+    return Terms(days[..., None], np.full(days.shape + (1,), OIS), np.ones(days.shape + (1,)),
+                 weights)
+
+
+def deposit_terms(deposits):
+    # D_tenor(T0) - (1 + L dt) D_tenor(TN) = 0 for blomvall_ndengo.Deposits
+    T0, TN, dt, L = deposits
+    days = np.stack([np.column_stack([T0, T0]), np.column_stack([TN, TN])], axis=1)
+    curves = np.broadcast_to([OIS, SPREAD], days.shape)
+    weights = np.column_stack([np.ones(len(L)), -(1 + L*dt)])
+    return Terms(days, curves, np.ones(days.shape), weights)
+
+
+def swap_terms(swaps):
+    """
+    Terms of the spot-starting IRS of blomvall_ndengo.Swaps, the fixed leg minus the
+    floating leg discounted on the OIS curve:
+
+        p sum_j fixed_dt[j] D(fixed_days[j])
+          - sum_k float_dt[k]/spans[k] (D_tenor(starts[k])/D_tenor(ends[k]) - 1) D(float_days[k])
+
+    with one term per fixed payment and two per floating coupon.
+    """
+    fixed_days, fixed_dt, float_days, float_dt, starts, ends, spans, p = swaps
+    n_swaps, n_fixed = fixed_days.shape
+    n_float = float_days.shape[1]
+    width = 5 # Phi and Pi at the start and the end, Phi at the payment
+
+    days = np.zeros((n_swaps, n_fixed + 2*n_float, width), dtype=np.int64)
+    curves = np.zeros(days.shape, dtype=np.int64)
+    coefs = np.zeros(days.shape)
+    days[:, :n_fixed, 0], coefs[:, :n_fixed, 0] = fixed_days, 1.0
+    forward = slice(n_fixed, n_fixed + n_float)
+    days[:, forward] = np.stack([starts, starts, ends, ends, float_days], axis=-1)
+    curves[:, forward] = [OIS, SPREAD, OIS, SPREAD, OIS]
+    coefs[:, forward] = [1.0, 1.0, -1.0, -1.0, 1.0]
+    days[:, n_fixed + n_float:, 0], coefs[:, n_fixed + n_float:, 0] = float_days, 1.0
+
+    coupon = float_dt/spans
+    weights = np.concatenate([p[:, None]*fixed_dt, -coupon, coupon], axis=1)
+    return Terms(days, curves, coefs, weights)
+
+
+def stacked(*terms):
+    # The rows of several Terms in one, padded to the most terms and factors of any row
+    n_terms = max(t.weights.shape[1] for t in terms)
+    width = max(t.days.shape[2] for t in terms)
+
+    def padded(a, value=0):
+        pad = [(0, 0), (0, n_terms - a.shape[1])] + [(0, width - a.shape[-1])]*(a.ndim - 2)
+        return np.pad(a, pad, constant_values=value)
+
+    return Terms(*(np.concatenate([padded(np.asarray(t[k])) for t in terms])
+                   for k in range(len(Terms._fields))))
+
+
+def term_values(Phis, terms, shift=0.0, z=0.0):
+    """
+    The weighted exponentials of every term, (rows, terms), for the prefix sums Phis
+    (curves, days) of the curves and a shift[i, k] z[i] added to the exponents (the price
+    deviations of opt5.mod, see shifts).
+    """
+    days, curves, coefs, weights = terms
+    exponent = np.sum(coefs*Phis[curves, days], axis=-1)/DAYS
+    return weights*np.exp(-(exponent + shift*np.asarray(z)[..., None]))
+
+
+def term_derivatives(values, terms):
+    # Derivative of every term of term_values with respect to the prefix-sum entry of each
+    # of its factors, (rows, terms, factors): -value coef/365
+    return -values[..., None]*terms.coefs/DAYS
@@ -0,0 +1,100 @@
+"""
+Incremental daily update of the curve and LOO error history.
+
+Each business day adds one row of quotes to the workbooks. update_history finds the
+valuation dates that are not yet in the stored error history, bootstraps and LOO-evaluates
+only those and merges them into it, so a daily run costs about one date instead of the
+whole history. The stored history stays newest first, as the workbooks. The pillars go to the same store as the notebook's (pillars.bootstrap_store).
+
+    python -m termstructure.history SEK
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import QuantLib as ql
+
+from termstructure import bootstrap, loo, quotes
+from termstructure.pillars import STORE_DIR, bootstrap_store, store_key, store_path
+
+DATE_COLUMN = "Valuation date \\ Maturity "
+
+
+def errors_path(layout, folder=STORE_DIR, method="Linear on Forward"):
+    return os.path.join(folder, store_key(layout)+"-dX_IRS-"+method.replace(" ", "_")+".csv")
+
+
+def read_errors(path):
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, parse_dates=[DATE_COLUMN])
+
+
+def update_history(currency, n_max=None, folder=".", cache_dir=None, processes=None,
+                   verbose=True):
+    """
+    Bootstrap and LOO-evaluate the valuation dates of the workbook that are missing from the
+    stored error history, merge their dX_IRS rows into it (newest first, as the workbooks
+    and dX_IRS_df) and return the new rows as a DataFrame. The
+    history and the pillars are stored in cache_dir, by default the .curve_cache folder next
+    to the workbooks in `folder`, so the same history is found from any working directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(folder, STORE_DIR)
+    dfs = quotes.align_quotes(quotes.load_panel(currency, n_max, folder)).frames()
+    layout, serials, OIS_ratess, IRS_ratess, IBOR_ratess = bootstrap.market_rates(currency, dfs)
+
+    path = errors_path(layout, cache_dir)
+    errors = read_errors(path)
+    done = bootstrap.to_serial(errors[DATE_COLUMN].values) if errors is not None else []
+    new = np.flatnonzero(~np.isin(serials, done))
+    if verbose:
+        print(len(serials)-len(new), "dates already evaluated,", len(new), "new.")
+    if len(new) == 0:
+        return pd.DataFrame(columns=[DATE_COLUMN]+loo.loo_columns(layout))
+
+    pillars = bootstrap_store(layout, serials[new],
+                              [OIS_ratess[k] for k in new], [IRS_ratess[k] for k in new],
+                              [IBOR_ratess[k] for k in new],
+                              path=store_path(layout, cache_dir), processes=processes,
+                              verbose=verbose)
+
+    error_tenor_data, error_tenor_f_data = loo.loo_tenor_data(layout, pillars)
+    dX_IRSss = []
+    for X, p in enumerate(pillars):
+        dX_IRSs = loo.valuation_errors(layout, p, error_tenor_f_data[X])
+        dX_IRSss.append([pd.Timestamp(loo.ql_to_datetime(ql.Date(int(p.valuation_date))))]
+                        + dX_IRSs)
+        if verbose:
+            print(ql.Date(int(p.valuation_date)), " done.")
+
+    dX_IRS_df = pd.DataFrame(dX_IRSss, columns=[DATE_COLUMN]+loo.loo_columns(layout))
+    history = dX_IRS_df if errors is None else pd.concat([dX_IRS_df, errors], ignore_index=True)
+    history = history.sort_values(DATE_COLUMN, ascending=False, kind="stable")
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path+".tmp"
+    history.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return dX_IRS_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bootstrap and LOO-evaluate the valuation dates not yet in the history.")
+    parser.add_argument("currency", choices=sorted(quotes.MARKETS))
+    parser.add_argument("--n-max", type=int, default=None,
+                        help="only use the n_max newest rows of the workbook")
+    parser.add_argument("--folder", default=".", help="folder with the Excel workbooks")
+    parser.add_argument("--cache-dir", default=None,
+                        help="folder of the history and the pillar store "
+                             "(default <folder>/"+STORE_DIR+")")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+    update_history(args.currency, args.n_max, args.folder, args.cache_dir,
+                   processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
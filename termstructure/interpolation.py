@@ -0,0 +1,266 @@
+"""
+Registry of the interpolation methods used on the bootstrapped pillars.
+
+Every method is evaluated through the same batched call, evaluate(method, x, y, t), with x
+and y the (dates x pillars) year fractions and rates and t the (dates x points) year
+fractions to evaluate at, so spot and forward pillars, the multiple-curve plots and the LOO
+all go through one code path. Points outside the pillars are extrapolated and NaN points
+(padding of ragged grids) give NaN.
+
+Linear, natural cubic and monotone convex are computed for all dates at once in NumPy;
+linear gives the same numbers as ql.LinearInterpolation and natural cubic agrees with
+ql.CubicNaturalSpline to rounding. Monotone convex is the method of Hagan and West on the
+pillar values (ql.ConvexMonotoneInterpolation reads its inputs as period forwards and floors
+negative rates, so it is not used). The other methods are fitted date by date with QuantLib
+or scipy. Monotonic cubic is ql.MonotonicCubicNaturalSpline, the natural spline with the
+Hyman filter: through 0, 0, 1, 1 it stays at 0 on the first segment, where the natural
+spline dips to -0.127, and on the curves of most dates the two differ between the pillars.
+
+check_methods checks every method on such cases, and check_pillars that a method passes
+through given pillars.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import QuantLib as ql
+
+Interpolator = namedtuple("Interpolator", ["label", "evaluate"])
+
+
+def _segments(x, t):
+    # Index k of the segment [x[:, k], x[:, k+1]] holding each t, clipped to the first and
+    # last segment (extrapolation). Pillars and points of all dates are sorted together by
+    # (date, value), pillars before points of equal value, and the pillars counted.
+    dates, n = x.shape
+    rows = np.concatenate([np.repeat(np.arange(dates), n), np.repeat(np.arange(dates), t.shape[1])])
+    values = np.concatenate([x.ravel(), t.ravel()])
+    is_pillar = np.concatenate([np.ones(x.size, dtype=np.int64), np.zeros(t.size, dtype=np.int64)])
+    order = np.lexsort((-is_pillar, values, rows))
+    count = np.empty(len(order), dtype=np.int64)
+    count[order] = np.cumsum(is_pillar[order])
+    k = count[x.size:].reshape(t.shape) - 1 - n*np.arange(dates)[:, None]
+    return np.clip(k, 0, n-2)
+
+
+def linear(x, y, t):
+    # Same operation order as ql.LinearInterpolation
+    k = _segments(x, t)
+    x0, x1 = np.take_along_axis(x, k, 1), np.take_along_axis(x, k+1, 1)
+    y0, y1 = np.take_along_axis(y, k, 1), np.take_along_axis(y, k+1, 1)
+    return y0 + (t - x0)*((y1 - y0)/(x1 - x0))
+
+
+def natural_cubic_second_derivatives(x, y):
+    # Second derivatives of the natural cubic spline through (x, y) along the last axis, for
+    # any batch shape. Thomas algorithm, vectorized over the batch.
+    n = x.shape[-1]
+    h = np.diff(x, axis=-1)
+    d = np.diff(y, axis=-1)/h
+    M = np.zeros_like(y)
+    if n < 3:
+        return M
+    # Tridiagonal system for M[1..n-2]: h[i-1] M[i-1] + 2(h[i-1]+h[i]) M[i] + h[i] M[i+1] = 6(d[i]-d[i-1])
+    diag = 2*(h[..., :-1] + h[..., 1:])
+    rhs = 6*(d[..., 1:] - d[..., :-1])
+    c = np.empty_like(diag)
+    r = np.empty_like(rhs)
+    c[..., 0] = h[..., 1]/diag[..., 0] if n > 3 else 0.0
+    r[..., 0] = rhs[..., 0]/diag[..., 0]
+    for i in range(1, n-2):
+        denom = diag[..., i] - h[..., i]*c[..., i-1]
+        c[..., i] = h[..., i+1]/denom if i < n-3 else 0.0
+        r[..., i] = (rhs[..., i] - h[..., i]*r[..., i-1])/denom
+    M[..., n-2] = r[..., n-3]
+    for i in range(n-4, -1, -1):
+        M[..., i+1] = r[..., i] - c[..., i]*M[..., i+2]
+    return M
+
+
+def cubic_value(x0, x1, y0, y1, M0, M1, t):
+    # Value at t of the cubic spline segment [x0, x1] with second derivatives M0, M1
+    h = x1 - x0
+    a = (x1 - t)/h
+    b = (t - x0)/h
+    return a*y0 + b*y1 + ((a**3 - a)*M0 + (b**3 - b)*M1)*h*h/6
+
+
+def natural_cubic(x, y, t):
+    M = natural_cubic_second_derivatives(x, y)
+    k = _segments(x, t)
+
+    def at(a, j):
+        return np.take_along_axis(a, j, 1)
+
+    return cubic_value(at(x, k), at(x, k+1), at(y, k), at(y, k+1), at(M, k), at(M, k+1), t)
+
+
+def monotone_convex_forwards(x, y):
+    """
+    Discrete forwards fd (dates, pillars-1) of the monotone convex method of Hagan and West
+    (2006) on the integrals I = x y, and the instantaneous forwards f (dates, pillars) at the
+    pillars. A pillar at x = 0 gives the forward there, so the curve passes through it.
+    There is no positivity collar, so negative rates stay negative.
+    """
+    I = x*y
+    h = np.diff(x, axis=-1)
+    fd = np.diff(I, axis=-1)/h
+    f = np.empty_like(y)
+    if x.shape[-1] == 2:
+        f[..., 0] = f[..., 1] = fd[..., 0]
+    else:
+        span = x[..., 2:] - x[..., :-2]
+        f[..., 1:-1] = (h[..., :-1]*fd[..., 1:] + h[..., 1:]*fd[..., :-1])/span
+        f[..., 0] = fd[..., 0] - 0.5*(f[..., 1] - fd[..., 0])
+        f[..., -1] = fd[..., -1] - 0.5*(f[..., -2] - fd[..., -1])
+    f[..., 0] = np.where(x[..., 0] == 0, y[..., 0], f[..., 0])
+    return fd, f
+
+
+def monotone_convex_integral(g0, g1, u):
+    # Integral over [0, u] of the deviation g of the forward from the discrete forward on a
+    # segment, with g(0) = g0, g(1) = g1 and a zero integral over the whole segment; the
+    # four regions of Hagan and West, and g = 0 when g0 or g1 is zero
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cube = lambda a: np.maximum(a, 0.0)**3
+        eta2 = (g1 + 2*g0)/(g1 - g0)
+        eta3 = 3*g1/(g1 - g0)
+        eta4 = g1/(g1 + g0)
+        A = -g0*g1/(g0 + g1)
+        regions = [
+            ((g0 < 0) & (-0.5*g0 <= g1) & (g1 <= -2*g0))
+            | ((g0 > 0) & (-0.5*g0 >= g1) & (g1 >= -2*g0)),
+            ((g0 < 0) & (g1 > -2*g0)) | ((g0 > 0) & (g1 < -2*g0)),
+            ((g0 > 0) & (g1 < 0) & (g1 > -0.5*g0)) | ((g0 < 0) & (g1 > 0) & (g1 < -0.5*g0)),
+            ((g0 > 0) & (g1 > 0)) | ((g0 < 0) & (g1 < 0)),
+        ]
+        integrals = [
+            g0*(u - 2*u**2 + u**3) + g1*(u**3 - u**2),
+            g0*u + (g1 - g0)*cube(u - eta2)/(3*(1 - eta2)**2),
+            g1*u + (g0 - g1)*eta3/3*(1 - cube(eta3 - u)/eta3**3),
+            A*u + (g0 - A)*eta4/3*(1 - cube(eta4 - u)/eta4**3)
+            + (g1 - A)*cube(u - eta4)/(3*(1 - eta4)**2),
+        ]
+        return np.select(regions, integrals, 0.0)
+
+
+def monotone_convex(x, y, t):
+    # Hagan-West monotone convex on y as rates over x: the forward of every segment averages
+    # its discrete forward, so the curve passes through the pillars, and is monotone where
+    # the discrete forwards are. Flat forward extrapolation on both sides.
+    fd, f = monotone_convex_forwards(x, y)
+    k = _segments(x, t)
+    at = lambda a, j: np.take_along_axis(a, j, 1)
+    x0, x1, y0, y1 = at(x, k), at(x, k+1), at(y, k), at(y, k+1)
+    d, f0, f1 = at(fd, k), at(f, k), at(f, k+1)
+    h = x1 - x0
+    u = np.clip((t - x0)/h, 0.0, 1.0)
+    I = x0*y0 + h*(d*u + monotone_convex_integral(f0 - d, f1 - d, u))
+    I += np.where(t > x[:, -1:], f[:, -1:]*(t - x[:, -1:]), 0.0)
+    I += np.where(t < x[:, :1], f[:, :1]*(t - x[:, :1]), 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.where(t == 0, f[:, :1], I/t)
+    # Exactly the pillar values at the pillars, rather than I/t rounded
+    return np.where(t == x0, y0, np.where(t == x1, y1, value))
+
+
+def _per_date(fit):
+    # Batched evaluate for a method without a closed form: fit(x_row, y_row) returns a
+    # function of an array of year fractions, called once per date on the non-NaN points.
+    def evaluate(x, y, t):
+        out = np.full(t.shape, np.nan)
+        for X in range(x.shape[0]):
+            points = ~np.isnan(t[X])
+            out[X, points] = fit(x[X], y[X])(t[X, points])
+        return out
+    return evaluate
+
+
+def _ql_fit(cls):
+    def fit(x, y):
+        f = cls(x.tolist(), y.tolist())
+        return lambda t: np.array([f(s, True) for s in t.tolist()])
+    return fit
+
+
+def _quadratic_fit(x, y):
+    from scipy import interpolate
+    return interpolate.interp1d(x, y, kind="quadratic", fill_value="extrapolate")
+
+
+def _pchip_fit(x, y):
+    from scipy import interpolate
+    return interpolate.PchipInterpolator(x, y, extrapolate=True)
+
+
+INTERPOLATORS = {
+    "linear": Interpolator("Linear", linear),
+    "natural_cubic": Interpolator("Natural Cubic Spline", natural_cubic),
+    "quadratic": Interpolator("Quadratic Spline", _per_date(_quadratic_fit)),
+    "pchip": Interpolator("PCHIP", _per_date(_pchip_fit)),
+    "monotonic_cubic": Interpolator("Monotonic Cubic Spline",
+                                    _per_date(_ql_fit(ql.MonotonicCubicNaturalSpline))),
+    "monotone_convex": Interpolator("Monotone Convex", monotone_convex),
+}
+
+
+def check_pillars(method, x, y, tol=1e-15):
+    # Raises ValueError if the `method` interpolant misses one of its pillars by more than tol
+    x, y, t = _arrays(x, y, x)
+    miss = np.abs(evaluate(method, x, y, t) - y).max()
+    if not miss <= tol:
+        raise ValueError(method+" misses its pillars by "+str(miss))
+
+
+def check_methods():
+    # Raises ValueError unless every method passes through pillars with negative rates, the
+    # monotone convex forwards average the discrete forwards, and the monotonic cubic spline
+    # is monotone on a step where the natural spline is not
+    x = np.array([0.0, 0.25, 1.0, 2.0, 5.0, 10.0])
+    y = np.array([-0.02, -0.02, -0.021, -0.019, -0.015, -0.022])
+    for method in INTERPOLATORS:
+        check_pillars(method, x, y)
+    fd, f = monotone_convex_forwards(x[None], y[None])
+    averages = monotone_convex_integral(f[:, :-1] - fd, f[:, 1:] - fd, np.ones_like(fd))
+    if np.abs(averages).max() > 1e-15:
+        raise ValueError("monotone_convex forwards do not average the discrete forwards")
+    step = np.linspace(0.0, 3.0, 301)
+    natural, monotonic = (evaluate(method, [0.0, 1.0, 2.0, 3.0], [0.0, 0.0, 1.0, 1.0], step)[0]
+                          for method in ("natural_cubic", "monotonic_cubic"))
+    if np.all(np.diff(natural) >= 0) or np.any(np.diff(monotonic) < 0):
+        raise ValueError("monotonic_cubic does not filter the natural cubic spline")
+
+
+def label(method, on=None):
+    # Name used in plot titles and file names, e.g. label("linear", "Forward") -> "Linear on Forward"
+    name = INTERPOLATORS[method].label
+    return name if on is None else name+" on "+on
+
+
+def _arrays(x, y, t):
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    t = np.asarray(t, dtype=np.float64)
+    if t.ndim < 2:
+        # The same points for every date
+        t = np.broadcast_to(np.atleast_1d(t), (x.shape[0], t.size))
+    return x, y, t
+
+
+def evaluate(method, x, y, t):
+    """
+    Interpolate the pillars (x, y) of every date at the year fractions t with `method`.
+
+    x and y are (dates, pillars) arrays (or one date as 1-D arrays) and t is (dates, points)
+    or a 1-D array of points shared by all dates. Returns a (dates, points) array.
+    """
+    if method not in INTERPOLATORS:
+        raise ValueError("Unknown interpolation method "+repr(method)+", choose one of "
+                         + ", ".join(INTERPOLATORS))
+    return INTERPOLATORS[method].evaluate(*_arrays(x, y, t))
+
+
+def evaluate_many(methods, x, y, t):
+    # {method: evaluate(method, x, y, t)}, for comparing methods on the same pillars
+    x, y, t = _arrays(x, y, t)
+    return {method: evaluate(method, x, y, t) for method in methods}
@@ -0,0 +1,222 @@
+"""
+Leave-one-out (LOO) evaluation of the bootstrapped tenor curves.
+
+For every interior pillar, the pillar is left out and predicted from the remaining ones with
+the chosen interpolation method. The IRS at the corresponding maturity is then repriced on
+a forward curve where that pillar has been replaced by its prediction, and the difference
+in fair rate to the pillar curve is the valuation error dX.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import QuantLib as ql
+
+from termstructure import bootstrap, interpolation, swaps
+
+unit = 100*100 # bp *100 %
+
+
+def loo_range(layout):
+    # Tenor pillars that are left out: all but the first and the last tenor
+    n_tenors = len(layout.ibor_tenors) + len(layout.irs_tenors)
+    return range(1, n_tenors-1)
+
+
+def loo_columns(layout):
+    tenors = list(layout.ibor_tenors) + list(layout.irs_tenors)
+    return [tenors[LOO_Y] for LOO_Y in loo_range(layout)]
+
+
+def ql_to_datetime(d):
+    return datetime.datetime(d.year(), d.month(), d.dayOfMonth())
+
+
+def loo_predict(method, x, y, js):
+    """
+    Batched LOO prediction. x and y are (dates x pillars) arrays and js the pillars to leave
+    out (interior pillars only). Returns, for every date and every j in js, the value at
+    x[:, j] of the `method` interpolant through all pillars but j, shape (dates, len(js)).
+    All the reduced curves are evaluated in one interpolation.evaluate call.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    js = np.asarray(js)
+    keep = np.array([np.delete(np.arange(x.shape[1]), j) for j in js]) # (len(js), n-1)
+    n_dates = x.shape[0]
+    xs = x[:, keep].reshape(n_dates*len(js), -1)
+    ys = y[:, keep].reshape(n_dates*len(js), -1)
+    t = x[:, js].reshape(n_dates*len(js), 1)
+    return interpolation.evaluate(method, xs, ys, t).reshape(n_dates, len(js))
+
+
+def loo_tenor_data(layout, pillars, method="linear"):
+    """
+    LOO predictions of the tenor zero rates and flat forwards for all dates of a PillarStore
+    (or one DatePillars), padded with 0.0 at both ends since those pillars are not left out.
+    Returns two (dates, n_tenors) arrays.
+    """
+    js = np.array(loo_range(layout))
+    error_tenor_data = loo_predict(method, pillars.tenor_year_fracs, pillars.tenor_pillars, js)
+    error_tenor_f_data = loo_predict(method, pillars.tenor_year_fracs, pillars.tenor_fwdPillars, js)
+    pad = ((0, 0), (1, 1))
+    return np.pad(error_tenor_data, pad), np.pad(error_tenor_f_data, pad)
+
+
+def valuation_errors(layout, p, error_tenor_f_data, rates=None, control=False):
+    """
+    dX_IRS of one date for every left-out tenor in loo_range(layout).
+
+    error_tenor_f_data are the padded LOO forward predictions from loo_tenor_data. As in the
+    thesis, the prediction with index LOO_Y replaces pillar LOO_Y+len(ibor_tenors) and the
+    swap with maturity tenors[LOO_Y] is repriced. rates (IBOR + IRS quotes) are only used
+    for the control printout.
+    """
+    return date_errors(layout, p, {None: error_tenor_f_data}, rates, control)[None]
+
+
+def date_errors(layout, p, error_tenor_f_datas, rates=None, control=False):
+    # valuation_errors for several LOO predictions of the same date, {key: padded forward
+    # predictions} -> {key: dX_IRSs}. The pillar curve, index and engine are built once per
+    # date and the swap once per tenor, on a relinkable handle. Each LOO:ed pillar then only
+    # costs one ForwardCurve, one relink and the repricing of the swap at tenors[LOO_Y]. The
+    # control printout is for the first key.
+    calendar, qlCurrency, dayConvention, fracConvention = bootstrap.conventions(layout.currency)
+    iborIndex_name, iborIndex_tenor = bootstrap.IBOR_INDEX[layout.currency]
+    valuation_date = ql.Date(int(p.valuation_date))
+    ql.Settings.instance().evaluationDate = valuation_date
+
+    tenors = list(layout.ibor_tenors) + list(layout.irs_tenors)
+    tenor_dates = [ql.Date(int(d)) for d in p.tenor_dates]
+    tenor_fwdPillars = p.tenor_fwdPillars.tolist() if hasattr(p.tenor_fwdPillars, "tolist") \
+        else list(p.tenor_fwdPillars)
+
+    if control:
+        print(valuation_date)
+        print("IRS from "+layout.currency+" curve.")
+        print(f"{'Maturity':^12}\t{' Pillar rate'}\t{' Quoted rate'}\t{'Rate-pillar '}\t{' Error rate'}\t{' Error-pillar'}")
+        print(f"{' '}           \t{' '}           \t{' '}             {'  diff'}      \t{''}           \t{' diff'}")
+        print(f"{' '}           \t{' X'}          \t{' X'}            {'  '}          \t{' X^{tilde}_i'}\t{' '}")
+
+    # One index, engine and swap per tenor on a relinkable handle, linked to the pillar curve
+    # and then to each error curve
+
+    tenorTermStructure = ql.RelinkableYieldTermStructureHandle()
+    index = ql.IborIndex(iborIndex_name, ql.Period(iborIndex_tenor),
+                         bootstrap.settlementDays, qlCurrency,
+                         calendar, ql.ModifiedFollowing,
+                         True, dayConvention, tenorTermStructure)
+    tenorEngine = ql.DiscountingSwapEngine(tenorTermStructure)
+
+    pillar_tenorCurve = ql.ForwardCurve(tenor_dates, tenor_fwdPillars, dayConvention)
+    pillar_tenorCurve.enableExtrapolation()
+
+    fixedRate = 0 # Can be set to zero since we are calculating the fair rate
+    forwardStart = ql.Period('0D')
+
+    dX_IRSss = {key: [] for key in error_tenor_f_datas}
+    for LOO_Y in loo_range(layout):
+        tenor = tenors[LOO_Y]
+        swap = ql.MakeVanillaSwap(ql.Period(tenor), index, fixedRate, forwardStart,
+                                  pricingEngine=tenorEngine)
+        tenorTermStructure.linkTo(pillar_tenorCurve)
+        pillar_rate = swap.fairRate()
+
+        for k, (key, error_tenor_f_data) in enumerate(error_tenor_f_datas.items()):
+            # Change the LOO:ed pillar to erroneous value:
+
+            error_tenor_fwdPillars = list(tenor_fwdPillars)
+            error_tenor_fwdPillars[LOO_Y+len(layout.ibor_tenors)] = error_tenor_f_data[LOO_Y]
+            error_tenorCurve = ql.ForwardCurve(tenor_dates, error_tenor_fwdPillars, dayConvention)
+            error_tenorCurve.enableExtrapolation()
+            tenorTermStructure.linkTo(error_tenorCurve)
+            error_rate = swap.fairRate()
+            if control and k == 0 and rates is not None:
+                rate = rates[LOO_Y]
+                print(f"{tenor:^12}\t{unit*pillar_rate: 0.6f} bp\t{unit*rate: 0.6f} bp \t{unit*abs(rate - pillar_rate ): 0.6f} bp\t{unit*error_rate: 0.6f} bp \t{unit*abs(error_rate - pillar_rate ): 0.6f} bp")
+
+            dX_IRSss[key].append(error_rate - pillar_rate)
+    return dX_IRSss
+
+
+# Sweep over several interpolation methods in one pass over the dates. The result is a tidy
+# table with one row per valuation date, left-out tenor and method.
+
+SWEEP_COLUMNS = ["valuation_date", "tenor", "method", "dX_IRS"]
+
+CONTROL_DATES = 3 # dates checked against QuantLib and printed by loo_sweep(control=True)
+
+
+def loo_error_cube(layout, pillars, methods, check_dates=0):
+    """
+    dX_IRS of every date of a PillarStore, method and left-out tenor, shape (dates, methods,
+    tenors in loo_columns), priced with swaps.SwapPricer instead of QuantLib swaps. The
+    pillar curve and one error curve per method and left-out pillar are priced together,
+    so the whole cube is a few batched matrix products after reading the swap schedules.
+    Agrees with date_errors to about 1e-15. The fair rates of the first check_dates dates
+    are checked against QuantLib's (swaps.quantlib_fair_rates), for every curve and tenor,
+    raising RuntimeError beyond swaps.FAIR_RATE_TOLERANCE.
+    """
+    js = np.array(loo_range(layout))
+    columns = loo_columns(layout)
+    dayConvention = bootstrap.conventions(layout.currency)[2]
+    schedules = [swaps.date_schedules(layout, serial, columns) for serial in pillars.valuation_dates]
+    pricer = swaps.SwapPricer(pillars.tenor_dates, schedules, dayConvention)
+
+    # Curve 0 is the pillar curve, curve 1+m*len(js)+k has pillar js[k] of method m LOO:ed
+    n_dates, n_loo = len(pillars), len(js)
+    curves = np.repeat(pillars.tenor_fwdPillars[:, None, :], 1 + len(methods)*n_loo, axis=1)
+    for m, method in enumerate(methods):
+        error_tenor_f_data = loo_tenor_data(layout, pillars, method)[1]
+        curves[:, 1 + m*n_loo + np.arange(n_loo), js+len(layout.ibor_tenors)] = error_tenor_f_data[:, js]
+    rates = pricer.fair_rates(curves)
+    for X in range(min(check_dates, n_dates)):
+        reference = swaps.quantlib_fair_rates(layout.currency, pillars.valuation_dates[X],
+                                              pillars.tenor_dates[X], curves[X], columns)
+        diff = np.abs(rates[X] - reference).max()
+        if not diff <= swaps.FAIR_RATE_TOLERANCE:
+            raise RuntimeError("SwapPricer fair rates differ from QuantLib's by "+str(diff)
+                               +" on "+str(ql.Date(int(pillars.valuation_dates[X]))))
+    error_rates = rates[:, 1:, :].reshape(n_dates, len(methods), n_loo, n_loo)
+    return np.diagonal(error_rates, axis1=2, axis2=3) - rates[:, None, 0, :]
+
+
+def loo_sweep(layout, pillars, methods, ratess=None, control=False, verbose=False):
+    """
+    dX_IRS for every date of a PillarStore and every interpolation method in `methods`
+    (names from interpolation.INTERPOLATORS), as a DataFrame with SWEEP_COLUMNS. The LOO
+    predictions of each method are computed for all dates at once and repriced with
+    loo_error_cube. With control=True the first CONTROL_DATES dates are also repriced
+    with QuantLib swaps: the fair rates are checked against the pricer's and the control
+    output of date_errors is printed; ratess (IBOR + IRS quotes per date) are only used for
+    that printout. The method column holds the label used in the thesis, e.g. "Linear on
+    Forward".
+    """
+    columns = loo_columns(layout)
+    dX = loo_error_cube(layout, pillars, methods, CONTROL_DATES if control else 0)
+    if verbose:
+        print(len(pillars), "dates repriced.")
+    if control:
+        error_tenor_f_data = loo_tenor_data(layout, pillars, methods[0])[1]
+        for X in range(min(CONTROL_DATES, len(pillars))):
+            rates = ratess[X] if ratess is not None else None
+            date_errors(layout, pillars[X], {methods[0]: error_tenor_f_data[X]}, rates, control)
+
+    n_dates, n_methods, n_tenors = dX.shape
+    dates = [ql_to_datetime(ql.Date(int(d))) for d in pillars.valuation_dates]
+    labels = [interpolation.label(method, "Forward") for method in methods]
+    return pd.DataFrame({"valuation_date": np.repeat(dates, n_methods*n_tenors),
+                         "tenor": np.tile(columns, n_dates*n_methods),
+                         "method": np.tile(np.repeat(labels, n_tenors), n_dates),
+                         "dX_IRS": dX.ravel()}, columns=SWEEP_COLUMNS)
+
+
+def sweep_panel(sweep, method, date_column="Valuation date \\ Maturity ", values="dX_IRS"):
+    # One method of a sweep back in the wide layout of dX_IRS_df: dates x tenors (values
+    # "dX_OIS" for the OIS errors of blomvall_ndengo.loo_sweep)
+    rows = sweep[sweep["method"] == method]
+    panel = rows.pivot(index="valuation_date", columns="tenor", values=values)
+    panel = panel.reindex(index=rows["valuation_date"].unique(), columns=rows["tenor"].unique())
+    panel = panel.rename_axis(index=date_column, columns=None).reset_index()
+    return panel
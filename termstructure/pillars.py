@@ -0,0 +1,241 @@
+"""
+Array-backed store for the bootstrapped pillars of a valuation-date history.
+
+All fields are contiguous 2-D arrays with one row per valuation date and one column per
+pillar. Dates are QuantLib serial numbers (int32), so no QuantLib objects are kept alive
+and later stages can slice rows and columns directly instead of copying lists.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from termstructure import bootstrap
+from termstructure.bootstrap import DatePillars
+
+DATE_FIELDS = ("ois_dates", "tenor_dates")
+VALUE_FIELDS = ("ois_pillars", "ois_f_pillars", "ois_year_fracs",
+                "tenor_pillars", "tenor_fwdPillars", "tenor_year_fracs")
+
+# Constructor order, matching the fields of DatePillars
+
+FIELDS = ("valuation_dates",) + DatePillars._fields[1:]
+
+
+class PillarStore:
+
+    def __init__(self, valuation_dates, ois_dates, ois_pillars, ois_f_pillars, ois_year_fracs,
+                 tenor_dates, tenor_pillars, tenor_fwdPillars, tenor_year_fracs):
+        self.valuation_dates = np.ascontiguousarray(valuation_dates, dtype=np.int32)
+        # OIS (risk-free) curve: pillar dates, zero rates, flat forwards, year fractions
+        self.ois_dates = np.ascontiguousarray(ois_dates, dtype=np.int32)
+        self.ois_pillars = np.ascontiguousarray(ois_pillars, dtype=np.float64)
+        self.ois_f_pillars = np.ascontiguousarray(ois_f_pillars, dtype=np.float64)
+        self.ois_year_fracs = np.ascontiguousarray(ois_year_fracs, dtype=np.float64)
+        # Tenor curve: pillar dates, zero rates, flat forwards, year fractions
+        self.tenor_dates = np.ascontiguousarray(tenor_dates, dtype=np.int32)
+        self.tenor_pillars = np.ascontiguousarray(tenor_pillars, dtype=np.float64)
+        self.tenor_fwdPillars = np.ascontiguousarray(tenor_fwdPillars, dtype=np.float64)
+        self.tenor_year_fracs = np.ascontiguousarray(tenor_year_fracs, dtype=np.float64)
+
+        n = len(self.valuation_dates)
+        for name in DATE_FIELDS + VALUE_FIELDS:
+            if getattr(self, name).shape[0] != n:
+                raise ValueError(name+" does not have one row per valuation date")
+        for prefix in ("ois_", "tenor_"):
+            shapes = {getattr(self, name).shape for name in DATE_FIELDS + VALUE_FIELDS
+                      if name.startswith(prefix)}
+            if len(shapes) != 1:
+                raise ValueError("Differing number of "+prefix[:-1]+" pillars between fields")
+
+    @classmethod
+    def from_pillars(cls, date_pillars):
+        # From a list of DatePillars, as returned by bootstrap.bootstrap_history. All dates
+        # must share the same pillar layout.
+        date_pillars = list(date_pillars)
+        if not date_pillars:
+            return cls.empty()
+        try:
+            return cls(*[np.array([getattr(p, field) for p in date_pillars])
+                         for field in DatePillars._fields])
+        except ValueError:
+            raise ValueError("The valuation dates do not share the same pillar layout")
+
+    @classmethod
+    def empty(cls, n_ois=0, n_tenor=0):
+        return cls(np.empty(0), *[np.empty((0, n_ois))]*4, *[np.empty((0, n_tenor))]*4)
+
+    def __len__(self):
+        return len(self.valuation_dates)
+
+    def __getitem__(self, X):
+        # Integer: the DatePillars of one date. Slice or index array: a new PillarStore.
+        if isinstance(X, (int, np.integer)):
+            return DatePillars(*[getattr(self, field)[X] for field in FIELDS])
+        return PillarStore(*[getattr(self, field)[X] for field in FIELDS])
+
+    def __iter__(self):
+        for X in range(len(self)):
+            yield self[X]
+
+    @property
+    def n_ois(self):
+        return self.ois_dates.shape[1]
+
+    @property
+    def n_tenor(self):
+        return self.tenor_dates.shape[1]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, field).nbytes for field in FIELDS)
+
+    def index_of(self, serial):
+        # Row of a valuation date, or -1 if the date is not in the store
+        rows = np.flatnonzero(self.valuation_dates == serial)
+        return int(rows[0]) if len(rows) else -1
+
+    def concatenate(self, other):
+        if len(self) == 0:
+            return other
+        if len(other) == 0:
+            return self
+        return PillarStore(*[np.concatenate([getattr(self, field), getattr(other, field)])
+                             for field in FIELDS])
+
+
+# Persisting the pillars between runs, so that the interpolation and LOO stages can be rerun
+# without bootstrapping again. One .npz file per currency, index pair and helper
+# configuration holds every bootstrapped date, newest first.
+
+STORE_VERSION = 1
+STORE_DIR = ".curve_cache"
+
+
+def store_key(layout):
+    config = bootstrap.helper_config(layout)
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+    return config["currency"]+"-"+config["ois_index"]+"-"+config["ibor_index"]+"-"+digest
+
+
+def store_path(layout, folder=STORE_DIR):
+    return os.path.join(folder, store_key(layout)+".npz")
+
+
+def save_store(store, path, layout, quotes=None):
+    # `quotes` holds the mid quotes each row was bootstrapped from (one row per date), so that
+    # revised quotes in the workbook are detected. Stores saved without them are reused as is.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    meta = {"version": STORE_VERSION,
+            "key": store_key(layout),
+            "helpers": bootstrap.helper_config(layout),
+            "first_date": int(store.valuation_dates.min()) if len(store) else None,
+            "last_date": int(store.valuation_dates.max()) if len(store) else None,
+            "n_dates": len(store)}
+    arrays = {field: getattr(store, field) for field in FIELDS}
+    if quotes is not None:
+        arrays["quotes"] = np.asarray(quotes, dtype=np.float64)
+    tmp = path+".tmp.npz"
+    np.savez(tmp, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp, path)
+
+
+def _load(path, layout):
+    try:
+        data = np.load(path)
+    except OSError:
+        return None, None
+    with data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != STORE_VERSION or meta.get("key") != store_key(layout):
+            return None, None
+        store = PillarStore(*[data[field] for field in FIELDS])
+        quotes = data["quotes"] if "quotes" in data.files else None
+    return store, quotes
+
+
+def load_store(path, layout, first_date=None, last_date=None):
+    """
+    Stored pillars for `layout`, optionally restricted to valuation dates (serial numbers)
+    within [first_date, last_date]. Returns None if there is no file or it was written
+    for another version or helper configuration.
+    """
+    store, quotes = _load(path, layout)
+    if store is None:
+        return None
+    keep = np.ones(len(store), dtype=bool)
+    if first_date is not None:
+        keep &= store.valuation_dates >= first_date
+    if last_date is not None:
+        keep &= store.valuation_dates <= last_date
+    return store if keep.all() else store[keep]
+
+
+def select(store, serials):
+    # Rows of `store` for the valuation dates `serials`, in that order (-1 where missing)
+    rows = np.full(len(serials), -1, dtype=np.int64)
+    if len(store):
+        order = np.argsort(store.valuation_dates, kind="stable")
+        sorted_dates = store.valuation_dates[order]
+        pos = np.minimum(np.searchsorted(sorted_dates, serials), len(order)-1)
+        found = sorted_dates[pos] == serials
+        rows[found] = order[pos[found]]
+    return rows
+
+
+def bootstrap_store(layout, serials, OIS_ratess, IRS_ratess, IBOR_ratess, path=None,
+                    processes=None, control=False, verbose=False, native=False):
+    """
+    PillarStore for the valuation dates `serials` (in that order), bootstrapping only the
+    dates that are not already stored at `path` with the same quotes. Newly bootstrapped
+    dates are added to the file. With path=None nothing is read or written. With native,
+    the new dates are bootstrapped together in NumPy (native_bootstrap.bootstrap_pillars,
+    processes do not apply), and control checks them against QuantLib's.
+    """
+    serials = np.asarray(serials, dtype=np.int32)
+    quotes = np.hstack([np.asarray(OIS_ratess, dtype=np.float64).reshape(len(serials), -1),
+                        np.asarray(IRS_ratess, dtype=np.float64).reshape(len(serials), -1),
+                        np.asarray(IBOR_ratess, dtype=np.float64).reshape(len(serials), -1)])
+    stored, stored_quotes = _load(path, layout) if path is not None else (None, None)
+    if stored is None:
+        stored = PillarStore.empty(len(layout.ois_tenors)+1,
+                                   len(layout.ibor_tenors)+len(layout.irs_tenors)+1)
+        stored_quotes = np.empty((0, quotes.shape[1]))
+
+    rows = select(stored, serials)
+    if stored_quotes is not None:
+        revised = rows >= 0
+        revised[revised] = ~np.all(stored_quotes[rows[revised]] == quotes[revised], axis=1)
+        if revised.any():
+            keep = np.ones(len(stored), dtype=bool)
+            keep[rows[revised]] = False
+            stored, stored_quotes = stored[keep], stored_quotes[keep]
+            rows = select(stored, serials)
+    new = np.flatnonzero(rows < 0)
+    if verbose:
+        print(len(serials)-len(new), "dates loaded from stored pillars,", len(new), "to bootstrap.")
+    if len(new) and native:
+        from termstructure import native_bootstrap
+        fresh = native_bootstrap.bootstrap_pillars(
+            layout, serials[new], [OIS_ratess[k] for k in new], [IRS_ratess[k] for k in new],
+            [IBOR_ratess[k] for k in new], control=control)
+    elif len(new):
+        fresh = PillarStore.from_pillars(bootstrap.bootstrap_history(
+            layout, serials[new],
+            [OIS_ratess[k] for k in new], [IRS_ratess[k] for k in new],
+            [IBOR_ratess[k] for k in new],
+            processes=processes, control=control, verbose=verbose))
+    if len(new):
+        stored = stored.concatenate(fresh)
+        if stored_quotes is not None:
+            stored_quotes = np.concatenate([stored_quotes, quotes[new]])
+        order = np.argsort(-stored.valuation_dates.astype(np.int64), kind="stable")
+        stored = stored[order]
+        if stored_quotes is not None:
+            stored_quotes = stored_quotes[order]
+        if path is not None:
+            save_store(stored, path, layout, stored_quotes)
+        rows = select(stored, serials)
+    return stored[rows]
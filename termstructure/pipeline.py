@@ -0,0 +1,125 @@
+"""
+Streaming pipeline from quote rows to LOO error rows.
+
+Instead of loading, bootstrapping, interpolating and LOO-evaluating the whole history stage
+by stage, each valuation date flows through chained generators:
+
+    quote rows -> bootstrap -> chunks of dates -> LOO (interpolate and reprice) -> output
+
+The quote panel is loaded and aligned up front (a few MB of floats), but the rates of a
+date are only converted when it is bootstrapped. Only one chunk of pillars and errors is
+alive at a time, every chunk is appended to the output as soon as it is done and the
+calendar and schedule caches (see calendars.cache_info) are cleared after it, so memory
+beyond the quote panel stays flat in n_max and the newest dates come out first. Dates are
+bootstrapped in workbook order on one CurveBuilder.
+
+    python -m termstructure.pipeline SEK --methods linear natural_cubic --out dX.csv
+"""
+
+import argparse
+import itertools
+import os
+
+from termstructure import bootstrap, calendars, interpolation, loo, quotes
+from termstructure.pillars import STORE_DIR, PillarStore
+
+CHUNK = 32 # dates per LOO pricing call
+
+
+def quote_rows(currency, n_max=None, folder="."):
+    """
+    Layout and a generator of (serial, OIS_rates, IRS_rates, IBOR_rates) per valuation date,
+    newest first, the mid rates of bootstrap.market_rates converted one date at a time. The
+    quote sheets come from the quote cache (see quotes.read_sheet).
+    """
+    aligned = quotes.align_quotes(quotes.load_panel(currency, n_max, folder))
+    OIS_bid, IRS_bid, OIS_ask, IRS_ask, IBOR = aligned.values
+    OIS_columns, IRS_columns, IBOR_columns = (aligned.columns[k] for k in (0, 1, 4))
+    layout = bootstrap.CurveLayout(currency, OIS_columns[1:], IRS_columns[1:],
+                                   [bootstrap.ql_tenor(c) for c in IBOR_columns[1:]])
+
+    def rows():
+        for serial, k in zip(bootstrap.to_serial(aligned.dates), range(len(aligned))):
+            yield (serial, ((OIS_bid[k]/100 + OIS_ask[k]/100)/2).tolist(),
+                   ((IRS_bid[k]/100 + IRS_ask[k]/100)/2).tolist(), (IBOR[k]/100).tolist())
+
+    return layout, rows()
+
+
+def bootstrapped(layout, rows):
+    # DatePillars of every quote row
+    for serial, OIS_rates, IRS_rates, IBOR_rates in rows:
+        yield bootstrap.bootstrap_date(layout, serial, OIS_rates, IRS_rates, IBOR_rates)
+
+
+def chunked(date_pillars, size=CHUNK):
+    # PillarStores of `size` consecutive dates
+    date_pillars = iter(date_pillars)
+    while True:
+        chunk = list(itertools.islice(date_pillars, size))
+        if not chunk:
+            return
+        yield PillarStore.from_pillars(chunk)
+
+
+def loo_errors(layout, stores, methods):
+    # loo.loo_sweep of every chunk, a DataFrame with loo.SWEEP_COLUMNS per chunk. The
+    # schedules and year fractions of one chunk's dates are not asked for again, so the
+    # calendar caches are cleared after each chunk instead of filling up over the history.
+    for store in stores:
+        frame = loo.loo_sweep(layout, store, methods)
+        calendars.cache_clear()
+        yield frame
+
+
+def appended(frames, path):
+    # Pass the frames through, appending each to the CSV file at `path` as it arrives
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for k, frame in enumerate(frames):
+        frame.to_csv(path, mode="w" if k == 0 else "a", header=k == 0, index=False)
+        yield frame
+
+
+def stream_errors(currency, methods=("linear",), n_max=None, folder=".", chunk=CHUNK,
+                  path=None, verbose=False):
+    """
+    Generator of dX_IRS DataFrames (loo.SWEEP_COLUMNS), one per chunk of valuation dates,
+    newest first. With a path, every chunk is also appended to that CSV file before it is
+    yielded.
+    """
+    methods = list(methods)
+    layout, rows = quote_rows(currency, n_max, folder)
+    frames = loo_errors(layout, chunked(bootstrapped(layout, rows), chunk), methods)
+    if path is not None:
+        frames = appended(frames, path)
+    for frame in frames:
+        if verbose:
+            print(frame["valuation_date"].iloc[0].date(), "to",
+                  frame["valuation_date"].iloc[-1].date(), "done.")
+        yield frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stream the quotes of a workbook through bootstrap and LOO to a CSV file "
+                    "of valuation errors, one chunk of dates at a time.")
+    parser.add_argument("currency", choices=sorted(quotes.MARKETS))
+    parser.add_argument("--methods", nargs="+", default=["linear"],
+                        choices=sorted(interpolation.INTERPOLATORS))
+    parser.add_argument("--n-max", type=int, default=None,
+                        help="only use the n_max newest rows of the workbook")
+    parser.add_argument("--folder", default=".", help="folder with the Excel workbooks")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="dates per LOO pricing call")
+    parser.add_argument("--out", default=None, help="CSV file for the errors "
+                        "(default "+STORE_DIR+"/<currency>-dX_IRS-stream.csv)")
+    args = parser.parse_args(argv)
+    path = args.out or os.path.join(STORE_DIR, args.currency+"-dX_IRS-stream.csv")
+    n_dates = 0
+    for frame in stream_errors(args.currency, args.methods, args.n_max, args.folder,
+                               args.chunk, path, verbose=True):
+        n_dates += frame["valuation_date"].nunique()
+    print(n_dates, "dates written to", path)
+
+
+if __name__ == "__main__":
+    main()
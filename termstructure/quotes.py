@@ -0,0 +1,200 @@
+"""
+Quote ingest.
+
+Parsing the Excel workbooks with pd.read_excel takes several seconds per sheet, since
+openpyxl reads the whole workbook on every call. The quote sheets are therefore converted
+once into a typed columnar cache (one .npy for the dates and one for the quotes per sheet),
+keyed by the SHA-256 of the workbook. Later runs load the cache in milliseconds and only
+re-ingest when the workbook has changed.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_DIR = ".quote_cache"
+
+# Overnight and IBOR index (sheet names) for each market
+
+MARKETS = {
+    "SEK": ("STINA", "STIBOR3M"),
+    "EUR": ("EONIA", "EURIBOR6M"),
+}
+
+
+# Columns used from each quote sheet (Excel ranges). One less IRS maturity is available
+# for SEK, so the IRS sheets are cut at 10Y for both markets.
+
+USECOLS = {"OIS": "A:S", "IRS": "A:K", "IBOR": "A:B"}
+
+
+def workbook_path(currency, folder="."):
+    return os.path.join(folder, "Exjobb"+currency+"5offline.xlsx")
+
+
+def quote_sheets(currency):
+    ois, ibor = MARKETS[currency]
+    return [ois+" bid", ois+" ask", ibor,
+            "Depos bid", "Depos ask",
+            "FRA bid", "FRA ask",
+            "IRS bid", "IRS ask"]
+
+
+def file_hash(path, blocksize=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _sheet_file(sheet):
+    return sheet.replace(" ", "_")
+
+
+def _cache_folder(path, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, stem+"-"+file_hash(path)[:16])
+
+
+def _typed(raw):
+    # First column as datetime64 (NaT for the RIC/header rows), the rest as float64 (NaN
+    # for the RIC strings and empty cells).
+    dates = pd.to_datetime(raw.iloc[:, 0], errors="coerce").values.astype("datetime64[ns]")
+    values = raw.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").values.astype(np.float64)
+    return dates, values
+
+
+def ingest(path, sheets, cache_dir=None):
+    folder = _cache_folder(path, cache_dir)
+    os.makedirs(folder, exist_ok=True)
+    raws = pd.read_excel(path, sheet_name=list(sheets))
+    columns = {}
+    for sheet, raw in raws.items():
+        dates, values = _typed(raw)
+        np.save(os.path.join(folder, _sheet_file(sheet)+".dates.npy"), dates)
+        np.save(os.path.join(folder, _sheet_file(sheet)+".values.npy"), values)
+        columns[sheet] = [str(c) for c in raw.columns]
+    # The index is written last, so an interrupted ingest is never taken for a valid cache
+    with open(os.path.join(folder, "index.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "workbook": os.path.basename(path),
+                   "columns": columns}, f)
+    return folder
+
+
+def _load_index(folder):
+    try:
+        with open(os.path.join(folder, "index.json")) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != CACHE_VERSION:
+        return None
+    return index
+
+
+def read_sheet(path, sheet, ncols=None, nrows=None, cache_dir=None, sheets=None):
+    """
+    Typed replacement for pd.read_excel(path, sheet_name=sheet, usecols=..., nrows=...).
+
+    The first column holds the dates and the remaining ncols-1 columns the quotes. All quote
+    sheets in `sheets` are ingested together on a cache miss.
+    """
+    folder = _cache_folder(path, cache_dir)
+    index = _load_index(folder)
+    if index is None or sheet not in index["columns"]:
+        ingest(path, sheets if sheets is not None else [sheet], cache_dir)
+        index = _load_index(folder)
+
+    dates = np.load(os.path.join(folder, _sheet_file(sheet)+".dates.npy"))
+    values = np.load(os.path.join(folder, _sheet_file(sheet)+".values.npy"))
+    columns = index["columns"][sheet]
+    if ncols is None:
+        ncols = len(columns)
+    data = pd.DataFrame(values[:nrows, :ncols-1], columns=columns[1:ncols])
+    data.insert(0, columns[0], dates[:nrows])
+    return data
+
+
+def usecols_width(usecols):
+    # Number of columns in an Excel range such as "A:S"
+    first, last = usecols.split(":")
+    return ord(last.upper()) - ord(first.upper()) + 1
+
+
+def load_panel(currency, n_max=None, folder=".", cache_dir=None):
+    # The five quote frames used for the thesis, in the order of the notebook's dfs:
+    # OIS bid, IRS bid, OIS ask, IRS ask, IBOR
+    ois, ibor = MARKETS[currency]
+    workbook = workbook_path(currency, folder)
+    sheets = quote_sheets(currency)
+
+    def read(sheet, kind):
+        return read_sheet(workbook, sheet, usecols_width(USECOLS[kind]), n_max,
+                          cache_dir=cache_dir, sheets=sheets)
+
+    return [read(ois+" bid", "OIS"), read("IRS bid", "IRS"),
+            read(ois+" ask", "OIS"), read("IRS ask", "IRS"),
+            read(ibor, "IBOR")]
+
+
+class AlignedQuotes:
+    """
+    Quote sheets restricted to the valuation dates they all have in common, with any date
+    holding a NaN quote in any sheet removed. Dates are sorted newest first, as in the
+    workbooks.
+    """
+
+    def __init__(self, dates, values, columns, dropped):
+        self.dates = dates          # datetime64[ns], shape (n_dates,)
+        self.values = values        # one float64 array (n_dates, n_tenors) per sheet
+        self.columns = columns      # column names per sheet, date column first
+        self.dropped = dropped      # number of dated rows removed per sheet
+
+    def __len__(self):
+        return len(self.dates)
+
+    def frames(self):
+        # Back to the DataFrame layout of getData(), date in the first column
+        dfs = []
+        for values, columns in zip(self.values, self.columns):
+            df = pd.DataFrame(values, columns=columns[1:])
+            df.insert(0, columns[0], self.dates)
+            dfs.append(df)
+        return dfs
+
+
+def align_quotes(dfs):
+    """
+    Align quote frames (date column first) on their common dates and drop every date with
+    a missing quote in any frame.
+
+    Header rows without a date are ignored and only the first row of a repeated date is
+    used.
+    """
+    indexed = []
+    for df in dfs:
+        dates = pd.DatetimeIndex(df.iloc[:, 0])
+        values = df.iloc[:, 1:].to_numpy(dtype=np.float64)
+        keep = ~dates.isna() & ~dates.duplicated(keep="first")
+        indexed.append(pd.DataFrame(values[keep], index=dates[keep]))
+
+    common = indexed[0].index
+    for df in indexed[1:]:
+        common = common.intersection(df.index)
+    common = common.sort_values(ascending=False)
+
+    values = [df.reindex(common).to_numpy() for df in indexed]
+    complete = np.ones(len(common), dtype=bool)
+    for v in values:
+        complete &= ~np.isnan(v).any(axis=1)
+
+    dropped = [len(df) - int(complete.sum()) for df in indexed]
+    return AlignedQuotes(common.values[complete], [v[complete] for v in values],
+                         [[str(c) for c in df.columns] for df in dfs], dropped)
@@ -0,0 +1,176 @@
+"""
+Daily forward surfaces of the Multiple curve.
+
+The "Interpolate Multiple Curve" stage evaluates each curve on every calendar day from the
+valuation date to its last pillar. Here this is done for all dates at once: the daily year
+fractions are NaN-padded (dates, days) grids from calendars.daily_grid, and each method is
+evaluated with interpolation.evaluate on blocks of dates, written into a dense float32
+(dates, days) surface. Column d holds the rate d days after the valuation date, NaN beyond
+the last pillar of the date.
+
+A surface can be streamed block by block to a memory-mapped file (write_surface), with a
+header holding the date axis and the curve metadata, so long histories never have to fit
+in memory and any rows or columns can be read back without loading the rest.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from termstructure import bootstrap, calendars, interpolation
+from termstructure.pillars import STORE_DIR, store_key
+
+BLOCK = 128 # dates per interpolation.evaluate call, bounds the float64 temporaries
+
+# (dates field, year fraction field, forward field) of each curve of a PillarStore
+
+CURVES = {
+    "ois": ("ois_dates", "ois_year_fracs", "ois_f_pillars"),
+    "tenor": ("tenor_dates", "tenor_year_fracs", "tenor_fwdPillars"),
+}
+
+
+def daily_grid(pillars, curve, dayCounter):
+    # (dates, days) year fractions of every day from the valuation date to the last pillar
+    dates = getattr(pillars, CURVES[curve][0])
+    return calendars.daily_grid(dayCounter, dates[:, 0], dates[:, -1])
+
+
+def forward_surface(method, x, y, grid, dtype=np.float32, block=BLOCK, out=None):
+    """
+    The `method` interpolant through the pillars (x, y) of every date, evaluated on the
+    daily grid, as a dense (dates, days) array of dtype (or written into `out`).
+    """
+    if out is None:
+        out = np.empty(grid.shape, dtype=dtype)
+    for start in range(0, grid.shape[0], block):
+        rows = slice(start, start+block)
+        out[rows] = interpolation.evaluate(method, x[rows], y[rows], grid[rows])
+    return out
+
+
+# Surface files: MAGIC, the length of the JSON header as 8 bytes little endian, the JSON
+# header, and the (dates, days) values in C order from the next multiple of ALIGN bytes.
+
+SURFACE_VERSION = 1
+MAGIC = b"TSSURF\x00\x01"
+ALIGN = 4096
+
+
+class Surface:
+    """
+    A daily forward surface and its header: the date axis (valuation_dates, last_dates, as
+    serial numbers) and the curve metadata (currency, store key, curve, method, day count).
+    values is a (dates, days) array, or a read-only np.memmap for a surface opened from file.
+    """
+
+    def __init__(self, header, values):
+        self.header = header
+        self.values = values
+        self.valuation_dates = np.array(header["valuation_dates"], dtype=np.int32)
+        self.last_dates = np.array(header["last_dates"], dtype=np.int32)
+
+    @property
+    def n_days(self):
+        # Number of days with a value, per date
+        return self.last_dates - self.valuation_dates + 1
+
+    def __len__(self):
+        return len(self.valuation_dates)
+
+    def index_of(self, serial):
+        # Row of a valuation date, or -1 if the date is not in the surface
+        rows = np.flatnonzero(self.valuation_dates == serial)
+        return int(rows[0]) if len(rows) else -1
+
+    def curve(self, X):
+        # The daily rates of row X, without the NaN padding
+        return self.values[X, :self.n_days[X]]
+
+    def year_fracs(self, rows=slice(None)):
+        # Daily year fraction grid of `rows`, as in calendars.daily_grid
+        fracConvention = bootstrap.conventions(self.header["currency"])[3]
+        return calendars.daily_grid(fracConvention, self.valuation_dates[rows],
+                                    self.last_dates[rows])
+
+    @classmethod
+    def open(cls, path):
+        header, offset = _read_header(path)
+        shape, dtype = tuple(header["shape"]), np.dtype(header["dtype"])
+        if 0 in shape:
+            return cls(header, np.empty(shape, dtype=dtype))
+        return cls(header, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape))
+
+
+def surface_header(layout, pillars, curve, method, dtype=np.float32):
+    dates = getattr(pillars, CURVES[curve][0])
+    n_days = int((dates[:, -1] - dates[:, 0]).max(initial=-1)) + 1
+    return {"version": SURFACE_VERSION,
+            "key": store_key(layout),
+            "currency": layout.currency,
+            "curve": curve,
+            "method": method,
+            "label": interpolation.label(method, "Forward"),
+            "day_counter": bootstrap.conventions(layout.currency)[3].name(),
+            "dtype": np.dtype(dtype).str,
+            "shape": [len(pillars), n_days],
+            "valuation_dates": dates[:, 0].tolist(),
+            "last_dates": dates[:, -1].tolist()}
+
+
+def daily_surface(layout, pillars, curve, method, dtype=np.float32, block=BLOCK):
+    # In-memory Surface of the "ois" or "tenor" curve of a PillarStore
+    header = surface_header(layout, pillars, curve, method, dtype)
+    fracConvention = bootstrap.conventions(layout.currency)[3]
+    grid = daily_grid(pillars, curve, fracConvention)
+    x, y = (getattr(pillars, field) for field in CURVES[curve][1:])
+    return Surface(header, forward_surface(method, x, y, grid, dtype, block))
+
+
+def surface_path(layout, curve, method, folder=STORE_DIR):
+    return os.path.join(folder, store_key(layout)+"-surface-"+curve+"-"+method+".dat")
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path+" is not a surface file")
+        length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(length).decode())
+    if header.get("version") != SURFACE_VERSION:
+        raise ValueError(path+" was written by another version of the surface store")
+    offset = -(-(len(MAGIC) + 8 + length)//ALIGN)*ALIGN
+    return header, offset
+
+
+def write_surface(path, layout, pillars, curve, method, dtype=np.float32, block=BLOCK):
+    """
+    Interpolate the "ois" or "tenor" curve of a PillarStore daily with `method` and stream
+    the surface to a memory-mapped file at `path`, `block` dates at a time, so only one
+    block of grid and rates is ever in memory. Returns the file opened read-only.
+    """
+    header = surface_header(layout, pillars, curve, method, dtype)
+    encoded = json.dumps(header).encode()
+    offset = -(-(len(MAGIC) + 8 + len(encoded))//ALIGN)*ALIGN
+    shape = tuple(header["shape"])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path+".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(encoded).to_bytes(8, "little") + encoded)
+        f.truncate(offset + int(np.prod(shape))*np.dtype(dtype).itemsize)
+    if 0 not in shape:
+        values = np.memmap(tmp, dtype=dtype, mode="r+", offset=offset, shape=shape)
+        fracConvention = bootstrap.conventions(layout.currency)[3]
+        dates = getattr(pillars, CURVES[curve][0])
+        x, y = (getattr(pillars, field) for field in CURVES[curve][1:])
+        for start in range(0, shape[0], block):
+            rows = slice(start, start+block)
+            grid = calendars.daily_grid(fracConvention, dates[rows, 0], dates[rows, -1],
+                                        shape[1])
+            forward_surface(method, x[rows], y[rows], grid, out=values[rows])
+        values.flush()
+        del values
+    os.replace(tmp, path)
+    return Surface.open(path)